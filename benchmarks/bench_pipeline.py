@@ -0,0 +1,201 @@
+"""
+Offline benchmarks for filter_leads, template matching and upload_to_sheets.
+
+Generates synthetic scraper CSVs, stubs WHOIS and Google Sheets, and writes
+timings to benchmarks/results/<commit>.json so runs can be compared across commits.
+
+    python3 benchmarks/bench_pipeline.py --sizes 1k,100k
+    python3 benchmarks/bench_pipeline.py --sizes 1m --compare benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import domain_checker
+from domain_checker import DomainChecker
+from filter_leads import filter_leads
+from template_matcher import get_best_template, classify_many
+from upload_to_sheets import upload_to_sheets
+from fake_sheets import FakeClient
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+NAME_WORDS = ["Auto", "Serwis", "Mechanik", "Pizzeria", "Bistro", "Kancelaria", "Fryzjer", "Studio",
+              "Łódź", "Żabka", "Kowalski", "Nowak", "Gabinet", "Warsztat", "Sklep", "Kawiarnia",
+              "Foto", "Design", "GSM", "Detailing", "Pro", "Plus", "Centrum", "Dom"]
+KEYWORDS = ["warsztat samochodowy", "mechanik", "pizzeria", "kancelaria", "fryzjer", "fotograf"]
+CITIES = ["Warszawa", "Kraków", "Łódź", "Wrocław", "Poznań", "Gdańsk"]
+
+def make_raw_frame(rows, seed=0):
+    """Synthetic scraper output with the columns filter_leads reads."""
+    rng = np.random.default_rng(seed)
+    words = np.array(NAME_WORDS)
+    titles = pd.Series(words[rng.integers(0, len(words), rows)])
+    for _ in range(2):
+        titles = titles + " " + words[rng.integers(0, len(words), rows)]
+    titles = titles + np.where(rng.random(rows) < 0.5, " " + rng.integers(1, 500, rows).astype(str), "")
+
+    cities = np.array(CITIES)[rng.integers(0, len(CITIES), rows)]
+    postal = rng.integers(0, 99, rows).astype(str)
+    complete_address = ('{"borough":"","street":"ul. Prosta ' + rng.integers(1, 200, rows).astype(str) +
+                        '","city":"' + cities + '","postal_code":"' + postal + '-100","state":"","country":"PL"}')
+
+    def sometimes(p, values):
+        return np.where(rng.random(rows) < p, values, None)
+
+    ids = np.arange(rows).astype(str)
+    lat = 52.2 + rng.random(rows) * 0.2
+    lon = 21.0 + rng.random(rows) * 0.3
+    return pd.DataFrame({
+        "input_id": ids,
+        "link": "https://www.google.com/maps/place/x/data=!4m2!3m1!1s0x" + ids,
+        "title": titles,
+        "category": "Business",
+        "address": "ul. Prosta 1, " + cities,
+        "website": sometimes(0.6, "https://example.pl"),
+        "phone": sometimes(0.8, "+48 22 " + rng.integers(1000000, 9999999, rows).astype(str)),
+        "review_count": rng.choice([0, 1, 2, 3, 5, 8, 20, 150], rows),
+        "review_rating": np.round(rng.uniform(1, 5, rows), 1),
+        "latitude": lat,
+        "longitude": lon,
+        "cid": ids,
+        "data_id": "0x" + ids,
+        "status": np.where(rng.random(rows) < 0.05, "permanently_closed", ""),
+        "complete_address": complete_address,
+        "emails": sometimes(0.2, "biuro@example.pl"),
+        "facebook": sometimes(0.1, "https://facebook.com/x"),
+        "instagram": sometimes(0.05, "https://instagram.com/x"),
+        "linkedin": None,
+        "user_reviews": "[]"
+    })
+
+def write_raw_files(rows, directory, files=len(KEYWORDS)):
+    """Splits the synthetic rows into one raw_{i}_{keyword}.csv per keyword."""
+    df = make_raw_frame(rows)
+    paths = {}
+    for i, rows_idx in enumerate(np.array_split(np.arange(len(df)), files)):
+        part = df.iloc[rows_idx]
+        kw = KEYWORDS[i % len(KEYWORDS)]
+        path = os.path.join(directory, f"raw_{i}_{kw.replace(' ', '_')}.csv")
+        part.to_csv(path, index=False)
+        paths[path] = kw
+    return paths
+
+def fake_whois_lookup(latency):
+    """Deterministic WHOIS stand-in: status derived from a hash of the domain."""
+    def lookup(domain):
+        if latency:
+            time.sleep(latency)
+        return ["Available", "Registered", "Registered", "Check Manually"][zlib.crc32(domain.encode()) % 4]
+    return lookup
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def bench_size(label, rows, workdir, whois_latency, workers):
+    results = []
+
+    def record(name, n, seconds):
+        results.append({"benchmark": name, "size": label, "rows": n,
+                        "seconds": round(seconds, 4), "rows_per_sec": round(n / seconds, 1) if seconds else None})
+        print(f"  {name:<22} {label:>5} {n:>9} rows {seconds:>9.3f}s")
+
+    raw_dir = os.path.join(workdir, f"raw_{label}")
+    os.makedirs(raw_dir, exist_ok=True)
+    seconds, input_files = timed(lambda: write_raw_files(rows, raw_dir))
+    print(f"  (generated {rows} rows in {seconds:.1f}s)")
+
+    # filter_leads end to end with stubbed WHOIS, no cache or lead index
+    output = os.path.join(workdir, f"filtered_{label}.csv")
+    checker = DomainChecker(workers=workers, rate_limits={"pl": 1e9, "com": 1e9})
+    seconds, leads = timed(lambda: filter_leads(input_files, output, domain_checker=checker))
+    record("filter_leads", rows, seconds)
+    lead_count = 0 if leads is None else len(leads)
+
+    # Template matching on the surviving leads
+    leads = pd.read_csv(output) if lead_count else pd.DataFrame(columns=["Business Name", "City"])
+    names = leads["Business Name"].tolist()
+    kws = [KEYWORDS[i % len(KEYWORDS)] if i % 3 else None for i in range(len(names))]
+    seconds, _ = timed(lambda: [get_best_template(n, "Warszawa", "", "", kw) for n, kw in zip(names, kws)])
+    record("get_best_template", len(names), seconds)
+    seconds, _ = timed(lambda: classify_many(names, kws))
+    record("classify_many", len(names), seconds)
+
+    # Upload against the in-memory Sheets fake
+    if lead_count:
+        seconds, _ = timed(lambda: upload_to_sheets(output, None, "bench", client=FakeClient()))
+        record("upload_to_sheets", lead_count, seconds)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r["benchmark"], r["size"]): r["seconds"] for r in baseline["results"]}
+    print(f"--- Compared with {baseline['commit']} ---")
+    for r in current:
+        before = old.get((r["benchmark"], r["size"]))
+        if before:
+            print(f"  {r['benchmark']:<22} {r['size']:>5} {before:>9.3f}s -> {r['seconds']:>9.3f}s "
+                  f"({before / r['seconds'] if r['seconds'] else float('inf'):.2f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="LeadFinder offline benchmarks")
+    parser.add_argument("--sizes", default="1k,100k", help=f"Comma-separated sizes: {', '.join(SIZES)}")
+    parser.add_argument("--whois-latency", type=float, default=0.0,
+                        help="Simulated seconds per WHOIS lookup (default 0)")
+    parser.add_argument("--workers", type=int, default=4, help="Domain check workers per TLD")
+    parser.add_argument("--compare", metavar="RESULTS_JSON", help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    domain_checker.whois_lookup = fake_whois_lookup(args.whois_latency)
+
+    commit = git_commit()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for label in args.sizes.lower().split(","):
+            print(f"--- Benchmark size {label} ---")
+            results.extend(bench_size(label, SIZES[label], workdir, args.whois_latency, args.workers))
+
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "whois_latency": args.whois_latency,
+        "results": results
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Local stand-in for the google-maps-scraper CLI, for running the scrape
+orchestration (worker pool, live tailing) without Docker or a browser.
+
+Accepts the same flags as the real scraper. Each input line is a query,
+optionally tagged `query #!# id`; the id is written to the input_id column.
+Rows are written progressively, after a simulated browser start-up.
+
+    "scraper_commands": {
+        "start": [],
+        "run": ["python3", "benchmarks/fake_scraper.py", "-input", "{data_dir}/{input_file}",
+                "-results", "{data_dir}/{results_file}", "-geo", "{geo}", "-radius", "{radius}"],
+        "stop": []
+    }
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_pipeline import make_raw_frame
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake google-maps-scraper")
+    parser.add_argument("-input", required=True)
+    parser.add_argument("-results", required=True)
+    parser.add_argument("-geo", default="52.2,21.0")
+    parser.add_argument("-radius", default="5000")
+    parser.add_argument("-lang", default="pl")
+    parser.add_argument("-depth", default="1")
+    parser.add_argument("-email", action="store_true")
+    parser.add_argument("--rows", type=int, default=int(os.environ.get("FAKE_SCRAPER_ROWS", 50)),
+                        help="Rows per query")
+    parser.add_argument("--startup", type=float, default=float(os.environ.get("FAKE_SCRAPER_STARTUP", 2)),
+                        help="Simulated browser start-up, in seconds")
+    parser.add_argument("--row-delay", type=float, default=float(os.environ.get("FAKE_SCRAPER_ROW_DELAY", 0.01)),
+                        help="Seconds between written rows")
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    time.sleep(args.startup)
+    lat, lon = (float(v) for v in args.geo.split(","))
+    with open(args.results, "w", newline="", encoding="utf-8") as out:
+        header = True
+        for line in queries:
+            query, _, input_id = (part.strip() for part in line.partition("#!#"))
+            rows = make_raw_frame(args.rows, seed=zlib.crc32(f"{query}@{args.geo}".encode()))
+            rows["input_id"] = input_id
+            rows["title"] = query.title() + " " + rows["title"]
+            # Same places for the same query and area, so overlapping runs can be deduplicated
+            rows["link"] = rows["link"] + "-" + str(zlib.crc32(query.encode()))
+            rows["data_id"] = rows["data_id"] + "-" + str(zlib.crc32(query.encode()))
+            rows["cid"] = rows["data_id"]
+            rows["latitude"] = lat + (rows["latitude"] - 52.3) / 10
+            rows["longitude"] = lon + (rows["longitude"] - 21.15) / 10
+            for i in range(len(rows)):
+                rows.iloc[i:i + 1].to_csv(out, index=False, header=header)
+                header = False
+                out.flush()
+                time.sleep(args.row_delay)
+        if header:
+            out.write(",".join(make_raw_frame(0).columns) + "\n")
+
+if __name__ == "__main__":
+    main()
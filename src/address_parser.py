@@ -0,0 +1,54 @@
+import json
+from functools import lru_cache
+import pandas as pd
+
+# orjson is optional: a faster drop-in for json.loads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# complete_address JSON key -> output column
+ADDRESS_FIELDS = {
+    'city': 'City',
+    'postal_code': 'Postal Code',
+    'street': 'Street'
+}
+EMPTY_ADDRESS = ("",) * len(ADDRESS_FIELDS)
+
+def _loads(text):
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except ValueError:
+            # orjson is stricter (e.g. NaN literals); let json have the final say
+            pass
+    return json.loads(text)
+
+@lru_cache(maxsize=100_000)
+def parse_address(address_json):
+    """
+    Parses a complete_address JSON string into a (city, postal code, street) tuple.
+    Missing or malformed payloads give empty strings.
+    Results are memoized by raw string, since nearby leads share payloads.
+    """
+    try:
+        if pd.isna(address_json) or not address_json:
+            return EMPTY_ADDRESS
+        data = _loads(address_json.replace("''", "'"))
+        return tuple(data.get(key, '') for key in ADDRESS_FIELDS)
+    except Exception:
+        return EMPTY_ADDRESS
+
+def parse_addresses(addresses):
+    """
+    Batch version of parse_address: parses each distinct payload once and returns
+    a DataFrame with City, Postal Code and Street columns aligned to addresses.
+    """
+    parsed = {a: parse_address(a) for a in addresses.dropna().unique()}
+    present = addresses.notna()
+    columns = {}
+    for i, column in enumerate(ADDRESS_FIELDS.values()):
+        values = addresses.map({a: fields[i] for a, fields in parsed.items()})
+        columns[column] = values.where(present, '')
+    return pd.DataFrame(columns, index=addresses.index)
@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import pandas as pd
+
+DEFAULT_CHECKPOINT_DIR = "processed_data/checkpoint"
+
+class Checkpoint:
+    """
+    Journal of completed units of work for one pipeline run.
+    Every finished unit (a keyword scrape, a stage, a single domain check)
+    is appended to journal.jsonl, so a crashed run can be resumed.
+    Stage outputs (DataFrames) are stored next to the journal.
+    """
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR, resume=False):
+        self.directory = directory
+        if not resume and os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory, exist_ok=True)
+        self.journal = os.path.join(directory, "journal.jsonl")
+        # (stage, unit) -> data
+        self.done = {}
+        if os.path.exists(self.journal):
+            with open(self.journal) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partially written last line of a crashed run
+                        continue
+                    self.done[(entry["stage"], entry["unit"])] = entry.get("data", {})
+
+    def is_done(self, stage, unit="all"):
+        return (stage, unit) in self.done
+
+    def get(self, stage, unit="all"):
+        """Returns the data recorded with a completed unit."""
+        return self.done.get((stage, unit), {})
+
+    def units(self, stage):
+        """Returns {unit: data} for every completed unit of a stage."""
+        return {unit: data for (s, unit), data in self.done.items() if s == stage}
+
+    def mark_done(self, stage, unit="all", **data):
+        """Records a unit of work as completed."""
+        self.done[(stage, unit)] = data
+        with open(self.journal, "a") as f:
+            f.write(json.dumps({"stage": stage, "unit": unit, "data": data}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def frame_path(self, stage):
+        return os.path.join(self.directory, f"{stage}.pkl")
+
+    def save_frame(self, stage, df):
+        """Stores a stage's output and marks the stage as completed."""
+        df.to_pickle(self.frame_path(stage))
+        self.mark_done(stage, rows=len(df))
+
+    def load_frame(self, stage):
+        """Loads a completed stage's output, or None if it is missing."""
+        if not self.is_done(stage) or not os.path.exists(self.frame_path(stage)):
+            return None
+        return pd.read_pickle(self.frame_path(stage))
@@ -0,0 +1,178 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+from names import clean_names_for_domain
+from lead_index import lead_keys
+from geo_tiling import METERS_PER_DEGREE
+
+DEFAULT_SIMILARITY = 0.85
+DEFAULT_RADIUS_M = 30
+
+# Neighbouring grid cells compared with each cell (each pair of cells only once)
+FORWARD_CELLS = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+def names_similar(a, b, threshold):
+    if a == b:
+        return True
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    # Cheap upper bounds first; ratio() is only computed for plausible pairs
+    return (matcher.real_quick_ratio() >= threshold and
+            matcher.quick_ratio() >= threshold and
+            matcher.ratio() >= threshold)
+
+class LeadDeduper:
+    """
+    Merges copies of the same business found by several keywords (or overlapping scrapes).
+    Rows are the same place if they share a place id / Maps link, or if their normalized
+    names are similar and they lie within radius_m of each other. Candidates are blocked
+    by a grid of radius_m cells, so only neighbours are compared.
+    """
+    def __init__(self, similarity=DEFAULT_SIMILARITY, radius_m=DEFAULT_RADIUS_M):
+        self.similarity = similarity
+        self.radius_m = radius_m
+
+    def positions(self, leads):
+        """
+        Normalized names and planar coordinates (meters) of every row, plus a mask
+        of rows usable for fuzzy matching. None if the columns are missing.
+        """
+        if not {'title', 'latitude', 'longitude'}.issubset(leads.columns):
+            return None
+        names = clean_names_for_domain(leads['title']).to_numpy()
+        lat = pd.to_numeric(leads['latitude'], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(leads['longitude'], errors='coerce').to_numpy(dtype=float)
+        y = lat * METERS_PER_DEGREE
+        x = lon * METERS_PER_DEGREE * np.cos(np.radians(np.nan_to_num(lat)))
+        valid = np.isfinite(y) & np.isfinite(x) & (names != '')
+        return names, y, x, valid
+
+    def group(self, leads):
+        """Returns, for every row position, the position of its group's first row."""
+        n = len(leads)
+        parent = list(range(n))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+        # 1. Exact: same place id / link
+        first = {}
+        for i, key in enumerate(lead_keys(leads).to_numpy()):
+            if key in first:
+                union(first[key], i)
+            else:
+                first[key] = i
+
+        # 2. Fuzzy: similar names in neighbouring grid cells
+        positions = self.positions(leads)
+        if positions is not None:
+            names, y, x, valid = positions
+            cells = defaultdict(list)
+            for i, cy, cx in zip(np.flatnonzero(valid), (y[valid] // self.radius_m).astype(int),
+                                 (x[valid] // self.radius_m).astype(int)):
+                cells[(cy, cx)].append(i)
+
+            radius_sq = self.radius_m ** 2
+            for (cy, cx), members in cells.items():
+                for dy, dx in FORWARD_CELLS:
+                    others = cells.get((cy + dy, cx + dx))
+                    if not others:
+                        continue
+                    for a_pos, i in enumerate(members):
+                        for j in (members[a_pos + 1:] if (dy, dx) == (0, 0) else others):
+                            if (y[i] - y[j]) ** 2 + (x[i] - x[j]) ** 2 > radius_sq:
+                                continue
+                            if find(i) != find(j) and names_similar(names[i], names[j], self.similarity):
+                                union(i, j)
+
+        return np.array([find(i) for i in range(n)])
+
+    def dedupe(self, leads):
+        """
+        Keeps the first row of each group. search_keyword becomes the list of every
+        keyword that found the place; duplicate_keys lists the lead keys merged into it.
+        Returns: (deduplicated leads, number of rows merged away)
+        """
+        if len(leads) < 2:
+            return leads, 0
+        roots = self.group(leads)
+        keep = roots == np.arange(len(leads))
+        removed = int(len(leads) - keep.sum())
+
+        keywords = leads['search_keyword'] if 'search_keyword' in leads.columns else pd.Series('', index=leads.index)
+        merged_keywords = [[kw] for kw in keywords]
+        duplicate_keys = [[] for _ in range(len(leads))]
+        if removed:
+            keys = lead_keys(leads).to_numpy()
+            for i in np.flatnonzero(~keep):
+                root = roots[i]
+                if keywords.iat[i] not in merged_keywords[root]:
+                    merged_keywords[root].append(keywords.iat[i])
+                duplicate_keys[root].append(keys[i])
+
+        deduped = leads[keep].copy()
+        deduped['search_keyword'] = [merged_keywords[i] for i in np.flatnonzero(keep)]
+        deduped['duplicate_keys'] = [duplicate_keys[i] for i in np.flatnonzero(keep)]
+        return deduped, removed
+
+class StreamingDeduper:
+    """
+    Applies a LeadDeduper to a stream of micro-batches. Each batch is deduplicated
+    on its own, then checked against the leads already emitted: their keys and
+    (name, position) per grid cell are remembered, a few bytes per unique lead.
+    Later copies are dropped; leads already sent downstream are not updated.
+    """
+    def __init__(self, deduper):
+        self.deduper = deduper
+        self.seen_keys = set()
+        self.cells = defaultdict(list)
+
+    def dedupe(self, leads):
+        """Returns: (leads not seen before, number of rows dropped)"""
+        leads, removed = self.deduper.dedupe(leads)
+        if leads.empty:
+            return leads, removed
+
+        keys = lead_keys(leads).to_numpy()
+        # Single-row batches come back without merge columns
+        merged_keys = leads['duplicate_keys'] if 'duplicate_keys' in leads.columns else None
+        positions = self.deduper.positions(leads)
+        radius = self.deduper.radius_m
+        keep = np.ones(len(leads), dtype=bool)
+        for i, key in enumerate(keys):
+            if key in self.seen_keys:
+                keep[i] = False
+                continue
+            if positions is not None and positions[3][i]:
+                name, y, x = positions[0][i], positions[1][i], positions[2][i]
+                cy, cx = int(y // radius), int(x // radius)
+                keep[i] = not any(
+                    (y - oy) ** 2 + (x - ox) ** 2 <= radius ** 2 and
+                    names_similar(name, other, self.deduper.similarity)
+                    for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                    for oy, ox, other in self.cells.get((cy + dy, cx + dx), ())
+                )
+                if keep[i]:
+                    self.cells[(cy, cx)].append((y, x, name))
+            if keep[i]:
+                self.seen_keys.add(key)
+                if merged_keys is not None:
+                    self.seen_keys.update(merged_keys.iat[i])
+        return leads[keep], removed + int((~keep).sum())
+
+def build_deduper(conf):
+    """Builds the within-run deduplicator from config/query.json settings, or None if disabled."""
+    if not conf.get("dedupe", True):
+        return None
+    return LeadDeduper(
+        similarity=conf.get("dedupe_similarity", DEFAULT_SIMILARITY),
+        radius_m=conf.get("dedupe_radius_m", DEFAULT_RADIUS_M)
+    )
@@ -0,0 +1,124 @@
+import random
+import socket
+import struct
+import time
+from metrics import METRICS
+
+# dnspython is optional: without it a minimal UDP client is used
+try:
+    import dns.resolver
+except ImportError:
+    dns = None
+
+DEFAULT_DNS_PORT = 53
+DEFAULT_DNS_TIMEOUT = 2.0
+FALLBACK_NAMESERVER = "8.8.8.8"
+
+QTYPE_NS = 2
+QTYPE_SOA = 6
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+def system_nameservers(path="/etc/resolv.conf"):
+    """Nameservers configured for this machine, or a public fallback."""
+    servers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    servers.append(parts[1])
+    except OSError:
+        pass
+    return servers or [FALLBACK_NAMESERVER]
+
+def build_query(domain, qtype, query_id):
+    """A DNS query packet with recursion desired."""
+    header = struct.pack(">HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(bytes([len(label)]) + label for label in domain.encode("idna").split(b".") if label)
+    return header + qname + b"\x00" + struct.pack(">HH", qtype, 1)
+
+class UdpResolver:
+    """
+    Minimal stdlib DNS client: sends one NS (then SOA) query over UDP and only
+    reads the response code and answer count.
+    """
+    def __init__(self, nameservers=None, port=DEFAULT_DNS_PORT, timeout=DEFAULT_DNS_TIMEOUT):
+        self.nameservers = list(nameservers or system_nameservers())
+        self.port = port
+        self.timeout = timeout
+
+    def query(self, domain, qtype):
+        """Returns (rcode, answer count), or None if no nameserver answered."""
+        for server in self.nameservers:
+            query_id = random.randint(0, 0xFFFF)
+            sock = socket.socket(socket.AF_INET6 if ":" in server else socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.settimeout(self.timeout)
+                sock.sendto(build_query(domain, qtype, query_id), (server, self.port))
+                while True:
+                    data, _ = sock.recvfrom(4096)
+                    if len(data) >= 12:
+                        response_id, flags, _, answers = struct.unpack(">HHHH", data[:8])
+                        if response_id == query_id:
+                            return flags & 0x000F, answers
+            except OSError:
+                continue
+            finally:
+                sock.close()
+        return None
+
+    def has_dns(self, domain):
+        """
+        True if the domain has NS or SOA records, False if it does not exist
+        in DNS, None if the lookup failed.
+        """
+        for qtype in (QTYPE_NS, QTYPE_SOA):
+            response = self.query(domain, qtype)
+            if response is None:
+                return None
+            rcode, answers = response
+            if rcode == RCODE_NXDOMAIN:
+                return False
+            if rcode != RCODE_NOERROR:
+                return None
+            if answers:
+                return True
+        return False
+
+class DnsPythonResolver:
+    """Same interface as UdpResolver, backed by dnspython."""
+    def __init__(self, nameservers=None, port=DEFAULT_DNS_PORT, timeout=DEFAULT_DNS_TIMEOUT):
+        self.resolver = dns.resolver.Resolver(configure=not nameservers)
+        if nameservers:
+            self.resolver.nameservers = list(nameservers)
+        self.resolver.port = port
+        self.resolver.lifetime = timeout
+
+    def has_dns(self, domain):
+        for rdtype in ("NS", "SOA"):
+            try:
+                self.resolver.resolve(domain, rdtype)
+                return True
+            except dns.resolver.NXDOMAIN:
+                return False
+            except dns.resolver.NoAnswer:
+                continue
+            except Exception:
+                return None
+        return False
+
+def build_resolver(nameservers=None, port=DEFAULT_DNS_PORT, timeout=DEFAULT_DNS_TIMEOUT):
+    """dnspython resolver when installed, the stdlib UDP client otherwise."""
+    if dns is not None:
+        return DnsPythonResolver(nameservers, port, timeout)
+    return UdpResolver(nameservers, port, timeout)
+
+def has_dns_records(resolver, domain):
+    """Runs one pre-screen lookup, recording its count and latency."""
+    METRICS.count("dns_queries")
+    start = time.perf_counter()
+    try:
+        return resolver.has_dns(domain)
+    finally:
+        METRICS.observe("dns_latency_seconds", time.perf_counter() - start)
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+import time
+from metrics import METRICS
+
+# Time-to-live per status, in hours.
+# 'Check Manually' is a failed lookup, so it is only cached briefly.
+DEFAULT_TTL_HOURS = {
+    "Available": 24,
+    "Registered": 24 * 30,
+    "Check Manually": 1
+}
+
+class DomainCache:
+    """
+    Persistent SQLite cache of domain availability results.
+    Each status expires after its own TTL.
+    """
+    def __init__(self, path, ttl_hours=None):
+        self.path = path
+        self.ttl_hours = dict(DEFAULT_TTL_HOURS)
+        self.ttl_hours.update(ttl_hours or {})
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS domains ("
+            "domain TEXT PRIMARY KEY, status TEXT NOT NULL, checked_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, domain):
+        """Returns the cached status for a domain, or None if missing or expired."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, checked_at FROM domains WHERE domain = ?", (domain,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.count("domain_cache_misses")
+                return None
+            status, checked_at = row
+            ttl = self.ttl_hours.get(status, 0) * 3600
+            if time.time() - checked_at > ttl:
+                self.misses += 1
+                self.expired += 1
+                METRICS.count("domain_cache_misses")
+                return None
+            self.hits += 1
+            METRICS.count("domain_cache_hits")
+            return status
+
+    def set(self, domain, status):
+        """Stores the status of a domain."""
+        if status in ("N/A", "Pending"):
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO domains (domain, status, checked_at) VALUES (?, ?, ?)",
+                (domain, status, time.time())
+            )
+            self.conn.commit()
+
+    def stats(self):
+        """Returns hit/miss counters for this run."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"Domain cache: {s['hits']} hits, {s['misses']} misses "
+              f"({s['expired']} expired), hit rate {s['hit_rate']:.0%}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,217 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import whois
+from domain_cache import DomainCache
+from rdap_client import RdapClient, DEFAULT_RDAP_TIMEOUT
+from dns_prescreen import build_resolver, has_dns_records, DEFAULT_DNS_PORT, DEFAULT_DNS_TIMEOUT
+from metrics import METRICS
+
+# Default requests per second allowed against each registry (keyed by TLD).
+# Matches the old 0.5s anti-block delay between lookups.
+DEFAULT_RATE_LIMITS = {"pl": 2.0, "com": 2.0}
+DEFAULT_TLDS = ("pl", "com")
+# Status of domains left unchecked by a lookup budget
+PENDING = "Pending"
+
+def whois_lookup(domain):
+    """
+    Checks if a domain is available using WHOIS.
+    Returns 'Available', 'Registered', or 'Check Manually'.
+    """
+    METRICS.count("whois_requests")
+    start = time.perf_counter()
+    try:
+        w = whois.whois(domain)
+        if not w.domain_name:
+            return "Available"
+        return "Registered"
+    except Exception as e:
+        if "No match for" in str(e) or "NOT FOUND" in str(e) or "No found" in str(e):
+            return "Available"
+        return "Check Manually"
+    finally:
+        METRICS.observe("whois_latency_seconds", time.perf_counter() - start)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Allows `rate` requests per second
+    with bursts of up to `capacity` requests.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class CheckBudget:
+    """
+    Caps the network lookups of one run by count and/or wall time.
+    The time budget starts with the first lookup, so ingest and scraping don't spend it.
+    Lookups past the cap are left Pending; cache hits are always free.
+    """
+    def __init__(self, seconds=None, requests=None):
+        self.seconds = seconds
+        self.deadline = None
+        self.requests = requests
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Reserves one lookup. Returns False once the budget is spent."""
+        with self.lock:
+            if self.seconds and self.deadline is None:
+                self.deadline = time.monotonic() + self.seconds
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                return False
+            if self.requests is not None and self.used >= self.requests:
+                return False
+            self.used += 1
+            return True
+
+class DomainChecker:
+    """
+    Concurrent domain availability engine.
+    Each TLD gets its own thread pool and rate limit,
+    so .pl and .com registries are queried in parallel.
+    With a DNS resolver, domains that have NS/SOA records are marked
+    Registered without spending a WHOIS request.
+    backend: optional object with lookup(domain) (e.g. RdapClient) used instead of WHOIS.
+    """
+    def __init__(self, workers=4, rate_limits=None, tlds=DEFAULT_TLDS, cache=None, resolver=None, backend=None):
+        self.workers = max(1, int(workers))
+        self.cache = cache
+        self.resolver = resolver
+        self.backend = backend
+        self.tlds = tuple(tlds)
+        limits = dict(DEFAULT_RATE_LIMITS)
+        limits.update(rate_limits or {})
+        self.buckets = {tld: TokenBucket(limits.get(tld, 1.0)) for tld in self.tlds}
+
+    def check(self, domain, budget=None):
+        """
+        Checks a single domain, respecting the rate limit of its TLD.
+        Cache hits and DNS pre-screen hits return without consuming a token.
+        With a CheckBudget, returns 'Pending' once the budget is spent.
+        """
+        if not domain:
+            return "N/A"
+        if self.cache is not None:
+            cached = self.cache.get(domain)
+            if cached:
+                return cached
+        if self.resolver is not None and has_dns_records(self.resolver, domain):
+            # Delegated in DNS, so it is registered; WHOIS is only for the rest
+            METRICS.count("dns_registered")
+            status = "Registered"
+        elif budget is not None and not budget.take():
+            return PENDING
+        else:
+            tld = domain.rsplit(".", 1)[-1]
+            bucket = self.buckets.get(tld)
+            if bucket:
+                bucket.acquire()
+            status = self.backend.lookup(domain) if self.backend is not None else whois_lookup(domain)
+        if self.cache is not None:
+            self.cache.set(domain, status)
+        return status
+
+    def check_domains(self, domains):
+        """
+        Checks a list of full domain names in bulk, each TLD on its own pool.
+        Returns: {domain: status}
+        """
+        unique_domains = list(dict.fromkeys(d for d in domains if d))
+        pools = {}
+        try:
+            futures = {}
+            for domain in unique_domains:
+                tld = domain.rsplit(".", 1)[-1]
+                if tld not in pools:
+                    pools[tld] = ThreadPoolExecutor(max_workers=self.workers)
+                futures[domain] = pools[tld].submit(self.check, domain)
+            return {domain: future.result() for domain, future in futures.items()}
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+    def check_names(self, base_names, on_result=None, budget=None):
+        """
+        Checks every base name against all configured TLDs, in the given order
+        (so a budget is spent on the first names).
+        on_result(name, {tld: status}) is called as each name completes.
+        Returns: {base_name: {tld: status}}
+        """
+        unique_names = list(dict.fromkeys(n for n in base_names if n))
+        results = {name: {} for name in unique_names}
+        if not unique_names:
+            return results
+
+        print(f"  > Checking {len(unique_names)} names on {', '.join('.' + t for t in self.tlds)} "
+              f"({self.workers} workers per TLD)")
+        # One pool per TLD so a slow registry never starves the others
+        pools = {tld: ThreadPoolExecutor(max_workers=self.workers) for tld in self.tlds}
+        try:
+            futures = {}
+            for name in unique_names:
+                for tld in self.tlds:
+                    futures[(name, tld)] = pools[tld].submit(self.check, f"{name}.{tld}", budget)
+            for name in unique_names:
+                for tld in self.tlds:
+                    results[name][tld] = futures[(name, tld)].result()
+                if on_result is not None:
+                    on_result(name, results[name])
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        return results
+
+def build_check_budget(conf):
+    """The per-run lookup budget from config/query.json settings, or None if unlimited."""
+    seconds = conf.get("domain_check_budget_seconds")
+    requests = conf.get("domain_check_budget_requests")
+    if not seconds and not requests:
+        return None
+    return CheckBudget(seconds=seconds, requests=requests)
+
+def build_domain_checker(conf):
+    """Builds the domain checker (and its cache) from config/query.json settings."""
+    cache_path = conf.get("domain_cache_path", "processed_data/domain_cache.sqlite")
+    domain_cache = DomainCache(cache_path, conf.get("domain_cache_ttl_hours")) if cache_path else None
+    resolver = None
+    if conf.get("dns_prescreen", True):
+        resolver = build_resolver(
+            nameservers=conf.get("dns_nameservers"),
+            port=conf.get("dns_port", DEFAULT_DNS_PORT),
+            timeout=conf.get("dns_timeout", DEFAULT_DNS_TIMEOUT)
+        )
+    workers = conf.get("whois_workers", 4)
+    backend = None
+    domain_backend = conf.get("domain_backend", "whois")
+    if domain_backend == "rdap":
+        # One keep-alive connection per worker and registry
+        backend = RdapClient(conf.get("rdap_servers"), pool_size=workers,
+                             timeout=conf.get("rdap_timeout", DEFAULT_RDAP_TIMEOUT))
+    elif domain_backend != "whois":
+        print(f"Warning: unknown domain_backend '{domain_backend}', using whois.")
+    return DomainChecker(
+        workers=workers,
+        rate_limits=conf.get("whois_rate_limits"),
+        cache=domain_cache,
+        resolver=resolver,
+        backend=backend
+    )
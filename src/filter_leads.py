@@ -1,197 +1,266 @@
 import pandas as pd
+import numpy as np
 import os
 import sys
-import json
-import whois
-import time
-import re
 # Add src to path so we can import template_matcher
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from template_matcher import get_best_template
+from template_matcher import classify_many, build_magic_link
+from domain_checker import DomainChecker, PENDING
+from ingest import load_raw_leads, DEFAULT_CHUNK_SIZE
+from storage import write_leads, LEAD_KEY_COLUMN
+from metrics import METRICS
+from address_parser import parse_addresses
+from names import clean_names_for_domain
 
-def clean_name_for_domain(name):
+def _has_text(col):
+    """Mask of cells that are not null and not blank."""
+    return col.notna() & col.astype(str).str.strip().ne('')
+
+def calculate_digital_score(leads):
     """
-    Cleans business name for domain checking:
-    - Lowers case
-    - Converts Polish characters to ASCII
-    - Removes all non-alphanumeric characters
+    Calculates a 'Digital Presence Score' (0-3) for every lead.
     """
-    if not name or pd.isna(name):
-        return ""
-    
-    # Lowercase
-    name = name.lower()
-    
-    # Polish character mapping
-    replacements = {
-        'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
-        'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z'
-    }
-    for char, replacement in replacements.items():
-        name = name.replace(char, replacement)
-    
-    # Remove everything except a-z and 0-9
-    name = re.sub(r'[^a-z0-9]', '', name)
-    return name
-
-def check_domain_availability(domain):
-    """
-    Checks if a domain is available using WHOIS.
-    Returns 'Available', 'Registered', or 'Error'.
-    """
-    if not domain:
-        return "N/A"
-    try:
-        w = whois.whois(domain)
-        if not w.domain_name:
-            return "Available"
-        return "Registered"
-    except Exception as e:
-        if "No match for" in str(e) or "NOT FOUND" in str(e) or "No found" in str(e):
-            return "Available"
-        return "Check Manually"
-
-def extract_city(address_json):
-    """
-    Safely extracts city from the complete_address JSON string.
-    """
-    try:
-        if pd.isna(address_json) or not address_json:
-            return ""
-        data = json.loads(address_json.replace("''", "'"))
-        return data.get('city', '')
-    except:
-        return ""
-
-def calculate_digital_score(row):
-    """
-    Calculates a 'Digital Presence Score' (0-3).
-    """
-    score = 0
-    if row.get('Phone') and str(row.get('Phone')).strip():
-        score += 1
+    # Missing phones (NaN) are counted as present, as in the original row-wise score
+    phone = leads['Phone']
+    score = (phone.isna() | phone.astype(str).str.strip().ne('')).astype(int)
+
     # Check for social media presence
-    socials = ['facebook', 'instagram', 'linkedin', 'twitter']
-    has_social = False
+    socials = [s for s in ['facebook', 'instagram', 'linkedin', 'twitter'] if s in leads.columns]
+    has_social = pd.Series(False, index=leads.index)
     for s in socials:
-        if s in row and pd.notna(row[s]) and str(row[s]).strip():
-            has_social = True
-            break
-    if has_social:
-        score += 1
-    
-    if row.get('website') and pd.notna(row['website']) and str(row['website']).strip():
-        score += 1
-        
+        has_social |= _has_text(leads[s])
+    score += has_social.astype(int)
+
+    if 'website' in leads.columns:
+        score += _has_text(leads['website']).astype(int)
+
     return score
 
-def build_contact_profile(row):
+def build_contact_profile(leads):
     """
-    Consolidates all contact info into a single readable string.
+    Consolidates all contact info into a single readable string per lead.
     """
     parts = []
-    if row.get('Phone') and pd.notna(row['Phone']):
-        parts.append(f"📞 {row['Phone']}")
-    
-    if row.get('emails') and pd.notna(row['emails']):
-        parts.append(f"📧 {row['emails']}")
+    for col, prefix in [('Phone', "📞 "), ('emails', "📧 ")]:
+        if col in leads.columns:
+            values = leads[col]
+            parts.append((values.notna() & values.astype(str).ne(''), prefix + values.astype(str)))
 
     socials = ['facebook', 'instagram', 'linkedin']
     for s in socials:
-        if s in row and pd.notna(row[s]) and str(row[s]).strip():
-            parts.append(f"🔗 {s.title()}: {row[s]}")
-            
-    return " | ".join(parts)
+        if s in leads.columns:
+            parts.append((_has_text(leads[s]), f"🔗 {s.title()}: " + leads[s].astype(str)))
+
+    profile = pd.Series('', index=leads.index, dtype=object)
+    for mask, text in parts:
+        sep = np.where(mask & profile.ne(''), " | ", "")
+        profile = profile + sep + text.where(mask, '')
+    return profile
 
-def filter_leads(input_files, output_file, max_reviews=5, forced_template=None):
+def load_leads(input_files, max_reviews=5, chunksize=DEFAULT_CHUNK_SIZE, lead_index=None, parquet_copy=False):
     """
-    Filters leads from multiple CSVs and checks domain availability.
+    Streams raw files, keeping only leads that pass the cheap filters
+    and (optionally) were not processed in earlier runs.
+    Returns the leads DataFrame, or None if nothing is left.
     """
-    if isinstance(input_files, str):
-        input_files = [input_files]
-
-    dfs = []
-    for f in input_files:
-        try:
-            dfs.append(pd.read_csv(f))
-        except Exception as e:
-            print(f"Error reading {f}: {e}")
-
-    if not dfs:
+    leads, total_rows = load_raw_leads(input_files, max_reviews, chunksize, parquet_copy)
+    if not total_rows:
         print("No data loaded.")
-        return
+        return None
 
-    df = pd.concat(dfs, ignore_index=True)
-    
-    # 0. Filter Status
-    if 'status' in df.columns:
-        df = df[~df['status'].astype(str).str.lower().isin(['permanently_closed', 'permanently closed'])]
+    if leads is None or leads.empty:
+        print("No leads found matching criteria.")
+        return None
+    print(f"Loaded {total_rows} raw rows, {len(leads)} pass the basic filters.")
+    METRICS.count("raw_rows", total_rows)
 
-    # 1. Filter: No Website
-    leads = df[df['website'].isna() | (df['website'].str.strip() == '')].copy()
+    # Skip places already processed in earlier runs
+    if lead_index is not None:
+        leads, seen = lead_index.split_known(leads)
+        print(f"Lead index: {len(leads)} new, {seen} already seen in previous runs.")
+        METRICS.count("known_leads_skipped", seen)
+        if leads.empty:
+            print("No new leads to process.")
+            return None
+    return leads
 
-    # 2. Filter: Review count
-    leads['review_count'] = pd.to_numeric(leads['review_count'], errors='coerce').fillna(0)
-    leads = leads[leads['review_count'] <= max_reviews]
+def dedupe_leads(leads, deduper):
+    """Merges copies of the same business found by several keywords."""
+    leads, removed = deduper.dedupe(leads)
+    print(f"Deduplication: {removed} duplicate listings merged, {len(leads)} unique leads.")
+    METRICS.count("duplicates_merged", removed)
+    return leads
 
-    if leads.empty:
-        print("No leads found matching criteria.")
-        return
-
-    # 3. Enrich Data
-    leads['City'] = leads['complete_address'].apply(extract_city)
+def enrich_leads(leads):
+    """Adds City, Postal Code, Street, Phone, Digital Score and Contact Profile columns."""
+    address = parse_addresses(leads['complete_address'])
+    for col in address.columns:
+        leads[col] = address[col]
     leads['Phone'] = leads['phone']
     
     for col in ['facebook', 'instagram', 'linkedin', 'emails']:
         if col not in leads.columns:
             leads[col] = None
 
-    leads['Digital Score'] = leads.apply(calculate_digital_score, axis=1)
-    leads['Contact Profile'] = leads.apply(build_contact_profile, axis=1)
+    leads['Digital Score'] = calculate_digital_score(leads)
+    leads['Contact Profile'] = build_contact_profile(leads)
+    return leads
 
-    # 4. Domain Check (.PL and .COM) & Template Matching
-    print(f"--- Checking domain availability and matching templates for {len(leads)} leads ---")
-    domain_pl = []
-    domain_com = []
-    template_slugs = []
-    magic_links = []
-    
-    for idx, row in leads.iterrows():
-        # Domain Check
-        base_name = clean_name_for_domain(row['title'])
-        if base_name:
-            print(f"  > Checking: {base_name}.pl/.com")
-            domain_pl.append(check_domain_availability(f"{base_name}.pl"))
-            time.sleep(0.5) # Anti-block delay
-            domain_com.append(check_domain_availability(f"{base_name}.com"))
-            time.sleep(0.5)
-        else:
-            domain_pl.append("N/A")
-            domain_com.append("N/A")
-            
-        # Template Matching (Updated for DSA V2)
-        search_kw = row.get('search_keyword', '')
-        # Pass 'address' and 'forced_template'
-        slug, link = get_best_template(
-            business_name=row['title'], 
-            city=row['City'], 
-            phone=row['Phone'],
-            address=row.get('address', ''), 
-            search_keyword=search_kw,
-            forced_template=forced_template
-        )
-        template_slugs.append(slug)
-        magic_links.append(link)
-
-    leads['Domain .PL'] = domain_pl
-    leads['Domain .COM'] = domain_com
-    leads['Template Slug'] = template_slugs
-    leads['Magic Link'] = magic_links
-
-    # 5. Sort: By Digital Score (Ghosts first), then Reviews
-    leads = leads.sort_values(by=['Digital Score', 'review_count'], ascending=[True, True])
-
-    # 6. Cleanup
+def prioritize_leads(leads):
+    """Sorts leads by priority: Digital Score (ghosts first), then reviews."""
+    return leads.sort_values(by=['Digital Score', 'review_count'], ascending=[True, True])
+
+def check_lead_domains(leads, domain_checker, checkpoint=None, limit=None, budget=None):
+    """
+    Adds 'Domain .PL' and 'Domain .COM' columns.
+    Leads are checked in their current (priority) order. Only the first `limit`
+    leads are checked, and a CheckBudget can stop earlier; the rest stay 'Pending'
+    for --check-pending.
+    With a checkpoint, every finished name is journaled and skipped on resume.
+    """
+    base_names = clean_names_for_domain(leads['title']).tolist()
+
+    availability = checkpoint.units("domain") if checkpoint is not None else {}
+    if availability:
+        print(f"  > Resuming: {len(availability)} names already checked")
+    eager = base_names[:limit] if limit is not None else base_names
+    pending = [n for n in eager if n not in availability]
+    on_result = None
+    if checkpoint is not None:
+        def on_result(name, result):
+            if PENDING not in result.values():
+                checkpoint.mark_done("domain", name, **result)
+    availability.update(domain_checker.check_names(pending, on_result=on_result, budget=budget))
+
+    unchecked = {'pl': PENDING, 'com': PENDING}
+    leads['Domain .PL'] = [availability.get(n, unchecked)['pl'] if n else "N/A" for n in base_names]
+    leads['Domain .COM'] = [availability.get(n, unchecked)['com'] if n else "N/A" for n in base_names]
+    pending_count = int(((leads['Domain .PL'] == PENDING) | (leads['Domain .COM'] == PENDING)).sum())
+    if pending_count:
+        print(f"  > {pending_count} lower-priority leads left Pending (run with --check-pending to check them)")
+        METRICS.count("domain_checks_pending", pending_count)
+    return leads
+
+def pending_mask(leads):
+    """Mask of output rows with a domain left 'Pending' by a limit or budget."""
+    return (leads['Domain .PL'] == PENDING) | (leads['Domain .COM'] == PENDING)
+
+def save_pending_leads(final_leads, pending_file):
+    """
+    Appends the output rows left 'Pending' to pending_file, which --check-pending reads.
+    Unlike the filtered leads CSV, it is not overwritten by the next run.
+    """
+    pending = final_leads[pending_mask(final_leads)]
+    if pending.empty:
+        return
+    if os.path.exists(pending_file) and os.path.getsize(pending_file):
+        header = pd.read_csv(pending_file, nrows=0).columns
+        pending.reindex(columns=header).to_csv(pending_file, mode="a", index=False, header=False)
+    else:
+        if os.path.dirname(pending_file):
+            os.makedirs(os.path.dirname(pending_file), exist_ok=True)
+        pending.to_csv(pending_file, index=False)
+
+def collect_pending_leads(pending_file, sources):
+    """Moves the rows of other pending files (e.g. one per queued job) into pending_file."""
+    for source in sources:
+        save_pending_leads(pd.read_csv(source, dtype=str, keep_default_na=False), pending_file)
+        os.remove(source)
+
+class PendingLeadsSink:
+    """Saves the leads left 'Pending' to pending_file batch by batch (streaming mode)."""
+    def __init__(self, pending_file):
+        self.pending_file = pending_file
+        self.buffered = 0
+
+    def write(self, leads):
+        save_pending_leads(leads, self.pending_file)
+
+    def poll(self):
+        """Nothing to do: every batch is written as it arrives."""
+
+    def close(self):
+        return True
+
+def check_pending_leads(pending_file, domain_checker, budget=None, leads_file=None, storage_format="csv"):
+    """
+    Checks the domains of the leads saved to pending_file by earlier runs.
+    The results are written back to pending_file; call settle_pending_leads once
+    they are in the sheet. Rows checked by an earlier pass whose upload failed
+    are returned again, so they are retried.
+    leads_file: the filtered leads CSV, updated too if it still holds these leads.
+    Returns the rows to update in the sheet (DataFrame), or None if there are none.
+    """
+    if not os.path.exists(pending_file):
+        print("No pending domain checks.")
+        return None
+    leads = pd.read_csv(pending_file, dtype=str, keep_default_na=False)
+    # Resumed runs may have saved the same lead twice
+    leads = leads.drop_duplicates(subset=LEAD_KEY_COLUMN, keep="last").reset_index(drop=True)
+    if leads.empty:
+        print("No pending domain checks.")
+        os.remove(pending_file)
+        return None
+
+    mask = pending_mask(leads)
+    if len(leads) > mask.sum():
+        print(f"  > {len(leads) - int(mask.sum())} leads checked earlier are not in the sheet yet")
+    columns = {'pl': 'Domain .PL', 'com': 'Domain .COM'}
+    if mask.any():
+        print(f"--- Checking domains for {int(mask.sum())} pending leads ---")
+        base_names = clean_names_for_domain(leads.loc[mask, 'Business Name']).tolist()
+        results = domain_checker.check_names(base_names, budget=budget)
+        for tld, col in columns.items():
+            current = leads.loc[mask, col]
+            checked = [results[n][tld] if n else "N/A" for n in base_names]
+            leads.loc[mask, col] = current.where(current != PENDING, checked)
+    leads.to_csv(pending_file, index=False)
+
+    if leads_file and os.path.exists(leads_file):
+        output = pd.read_csv(leads_file, dtype=str, keep_default_na=False)
+        by_key = leads.set_index(LEAD_KEY_COLUMN)
+        hit = output[LEAD_KEY_COLUMN].isin(by_key.index)
+        if hit.any():
+            for col in columns.values():
+                output.loc[hit, col] = output.loc[hit, LEAD_KEY_COLUMN].map(by_key[col])
+            write_leads(output, leads_file, storage_format)
+    return leads
+
+def settle_pending_leads(pending_file):
+    """
+    Drops the leads whose domains are now checked from pending_file, once the
+    sheet has been updated. Leads still 'Pending' (budget spent again) stay.
+    """
+    if not os.path.exists(pending_file):
+        return
+    leads = pd.read_csv(pending_file, dtype=str, keep_default_na=False)
+    still_pending = leads[pending_mask(leads)]
+    if still_pending.empty:
+        os.remove(pending_file)
+    else:
+        print(f"  > {len(still_pending)} leads still Pending, kept in {pending_file}")
+        still_pending.to_csv(pending_file, index=False)
+
+def match_templates(leads, forced_template=None):
+    """Adds 'Template Slug' and 'Magic Link' columns (DSA V2)."""
+    search_kws = leads['search_keyword'] if 'search_keyword' in leads.columns else [''] * len(leads)
+    # Deduplicated leads carry every keyword that found them
+    search_kws = [' '.join(kw) if isinstance(kw, list) else kw for kw in search_kws]
+    addresses = leads['address'] if 'address' in leads.columns else [''] * len(leads)
+    leads['Template Slug'] = classify_many(leads['title'], search_kws, forced_template)
+    leads['Magic Link'] = [
+        build_magic_link(slug, name, city, phone, address)
+        for slug, name, city, phone, address
+        in zip(leads['Template Slug'], leads['title'], leads['City'], leads['Phone'], addresses)
+    ]
+    return leads
+
+def finalize_leads(leads):
+    """Sorts leads and keeps/renames the output columns."""
+    # Sort: By Digital Score (Ghosts first), then Reviews
+    leads = prioritize_leads(leads)
+
+    # Cleanup
     columns_to_keep = {
         'title': 'Business Name',
         'City': 'City',
@@ -204,15 +273,86 @@ def filter_leads(input_files, output_file, max_reviews=5, forced_template=None):
         'Digital Score': 'Digital Score',
         'review_count': 'Reviews',
         'review_rating': 'Rating',
-        'link': 'Maps URL'
+        'link': 'Maps URL',
+        # Last, so sheets written by earlier versions keep their column order
+        'Postal Code': 'Postal Code'
     }
     
     existing_cols = [col for col in columns_to_keep.keys() if col in leads.columns]
-    final_leads = leads[existing_cols].rename(columns=columns_to_keep)
+    return leads[existing_cols].rename(columns=columns_to_keep)
+
+def run_stage(checkpoint, stage, compute, rows_in=None):
+    """
+    Runs a timed DataFrame stage, or loads its output if a resumed checkpoint has it.
+    """
+    with METRICS.stage(stage, rows_in) as info:
+        if checkpoint is not None:
+            leads = checkpoint.load_frame(stage)
+            if leads is not None:
+                print(f"  > Resuming: '{stage}' loaded from checkpoint ({len(leads)} leads)")
+                info["resumed"] = True
+                info["rows_out"] = len(leads)
+                return leads
+        leads = compute()
+        if checkpoint is not None and leads is not None:
+            checkpoint.save_frame(stage, leads)
+        info["rows_out"] = 0 if leads is None else len(leads)
+        return leads
+
+def filter_leads(input_files, output_file, max_reviews=5, forced_template=None, domain_checker=None,
+                 chunksize=DEFAULT_CHUNK_SIZE, lead_index=None, checkpoint=None, storage_format="csv",
+                 deduper=None, domain_limit=None, domain_budget=None, pending_file=None, raw_parquet_copy=False):
+    """
+    Filters leads from multiple CSVs and checks domain availability.
+    input_files: a path, a list of paths, or a {path: search keyword} dict.
+    checkpoint: optional Checkpoint; completed stages are reused on resume.
+    storage_format: "parquet" also saves a typed Parquet copy of output_file.
+    raw_parquet_copy: save typed Parquet copies of the raw CSVs while reading them, for later runs.
+    deduper: optional LeadDeduper merging businesses found by several keywords.
+    domain_limit / domain_budget: only the top domain_limit leads by priority are checked,
+    within an optional CheckBudget; the rest are marked 'Pending' and saved to pending_file.
+    lead_index: leads it already holds are skipped. The new leads are not added to it here:
+    the caller records them once they have reached their destination (e.g. the sheet).
+    Returns the processed leads written to output_file (DataFrame), or None if there were none.
+    """
+    if domain_checker is None:
+        domain_checker = DomainChecker()
+
+    # 0-2. Ingest: stream raw files through the cheap filters
+    leads = run_stage(checkpoint, "ingest",
+                      lambda: load_leads(input_files, max_reviews, chunksize, lead_index, raw_parquet_copy))
+    if leads is None:
+        return None
+
+    # 2b. Merge duplicate listings before any per-lead network work
+    if deduper is not None:
+        leads = run_stage(checkpoint, "dedupe", lambda: dedupe_leads(leads, deduper), len(leads))
+
+    # 3. Enrich Data
+    leads = run_stage(checkpoint, "enrich", lambda: enrich_leads(leads), len(leads))
+
+    # 4. Domain Check (.PL and .COM) & Template Matching
+    # Highest-priority leads first, so limits and budgets are spent on them
+    leads = prioritize_leads(leads)
+    print(f"--- Checking domain availability and matching templates for {len(leads)} leads ---")
+    leads = run_stage(checkpoint, "domains",
+                      lambda: check_lead_domains(leads, domain_checker, checkpoint, domain_limit, domain_budget),
+                      len(leads))
+    leads = run_stage(checkpoint, "templates", lambda: match_templates(leads, forced_template), len(leads))
+
+    # 5-6. Sort & Cleanup
+    with METRICS.stage("finalize", len(leads)) as info:
+        final_leads = finalize_leads(leads)
+        info["rows_out"] = len(final_leads)
 
     # Save
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    final_leads.to_csv(output_file, index=False)
-    
+    write_leads(final_leads, output_file, storage_format)
+    if pending_file:
+        save_pending_leads(final_leads, pending_file)
+
+    if domain_checker.cache is not None:
+        domain_checker.cache.print_stats()
     print(f"Filtering & Domain Checks complete. {len(final_leads)} leads found.")
     print(f"Output saved to: {output_file}")
+    return leads
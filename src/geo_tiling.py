@@ -0,0 +1,100 @@
+import glob
+import math
+import os
+import pandas as pd
+from lead_index import lead_keys
+
+METERS_PER_DEGREE = 111320.0
+
+def meters_to_degrees(lat, dy, dx):
+    """Converts a north/east offset in meters to a (lat, lon) offset in degrees."""
+    return dy / METERS_PER_DEGREE, dx / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+
+def hex_grid(half_height, half_width, tile_radius):
+    """
+    Hexagonal lattice of tile center offsets (in meters) covering a rectangle around the origin.
+    Circles of tile_radius placed on this lattice cover the plane without gaps.
+    """
+    dx = tile_radius * math.sqrt(3)
+    dy = tile_radius * 1.5
+    rows = int(math.ceil(half_height / dy)) + 1
+    cols = int(math.ceil(half_width / dx)) + 1
+    centers = []
+    for r in range(-rows, rows + 1):
+        # Every other row is shifted by half a cell
+        offset = dx / 2 if r % 2 else 0.0
+        for c in range(-cols, cols + 1):
+            x, y = c * dx + offset, r * dy
+            if abs(y) <= half_height + tile_radius and abs(x) <= half_width + tile_radius:
+                centers.append((y, x))
+    return centers
+
+def plan_tiles(lat, lon, radius, tile_radius):
+    """
+    Splits a large search circle into smaller hexagonal cells.
+    Returns: list of (lat, lon) cell centers; cells overlap slightly at the edges.
+    """
+    lat, lon = float(lat), float(lon)
+    if tile_radius >= radius:
+        return [(lat, lon)]
+    tiles = []
+    for y, x in hex_grid(radius, radius, tile_radius):
+        # Keep every cell that can cover part of the requested circle
+        if math.hypot(x, y) <= radius + tile_radius:
+            dlat, dlon = meters_to_degrees(lat, y, x)
+            tiles.append((round(lat + dlat, 6), round(lon + dlon, 6)))
+    return tiles
+
+def plan_bbox_tiles(min_lat, min_lon, max_lat, max_lon, tile_radius):
+    """
+    Covers a bounding box with hexagonal cells.
+    Returns: list of (lat, lon) cell centers.
+    """
+    lat = (min_lat + max_lat) / 2
+    lon = (min_lon + max_lon) / 2
+    half_height = (max_lat - min_lat) / 2 * METERS_PER_DEGREE
+    half_width = (max_lon - min_lon) / 2 * METERS_PER_DEGREE * math.cos(math.radians(lat))
+    tiles = []
+    for y, x in hex_grid(half_height, half_width, tile_radius):
+        dlat, dlon = meters_to_degrees(lat, y, x)
+        tiles.append((round(lat + dlat, 6), round(lon + dlon, 6)))
+    return tiles
+
+def tile_file(output_raw, tiles_dir, index):
+    stem = os.path.splitext(os.path.basename(output_raw))[0]
+    return os.path.join(tiles_dir, f"{stem}_t{index}.csv")
+
+def plan_tiled_jobs(keyword_files, tiles, tile_radius, tiles_dir, **scrape_args):
+    """
+    Schedules one scrape job per cell x keyword.
+    keyword_files: {keyword: merged raw output file}
+    """
+    os.makedirs(tiles_dir, exist_ok=True)
+    jobs = []
+    for kw, output_raw in keyword_files.items():
+        for i, (lat, lon) in enumerate(tiles):
+            jobs.append(dict(scrape_args, keyword=kw, lat=lat, lon=lon, radius=int(tile_radius),
+                             output_raw=tile_file(output_raw, tiles_dir, i)))
+    return jobs
+
+def merge_tiles(keyword_files, tiles_dir):
+    """
+    Merges each keyword's cell results into its raw file, dropping places
+    found by several overlapping cells (same place id/link, or same name
+    at the same rounded coordinates).
+    """
+    for kw, output_raw in keyword_files.items():
+        stem = os.path.splitext(os.path.basename(output_raw))[0]
+        parts = []
+        for f in sorted(glob.glob(os.path.join(tiles_dir, f"{stem}_t*.csv"))):
+            try:
+                parts.append(pd.read_csv(f, dtype=str))
+            except Exception as e:
+                print(f"Error reading {f}: {e}")
+        if not parts:
+            continue
+        merged = pd.concat(parts, ignore_index=True)
+        deduped = merged[~lead_keys(merged).duplicated()]
+        deduped.to_csv(output_raw, index=False)
+        print(f"Merged {len(parts)} cells for '{kw}': {len(merged)} rows, "
+              f"{len(merged) - len(deduped)} overlap duplicates removed.")
@@ -0,0 +1,242 @@
+import io
+import os
+import re
+import pandas as pd
+import storage
+
+# Columns of the scraper output used downstream, with explicit dtypes.
+# Everything else in the raw CSV (reviews, images, open hours...) is never loaded.
+RAW_DTYPES = {
+    'title': 'str',
+    'link': 'str',
+    'cid': 'str',
+    'data_id': 'str',
+    'address': 'str',
+    'complete_address': 'str',
+    'website': 'str',
+    'phone': 'str',
+    'emails': 'str',
+    'facebook': 'str',
+    'instagram': 'str',
+    'linkedin': 'str',
+    'twitter': 'str',
+    'status': 'str',
+    'review_count': 'str',
+    'review_rating': 'float64',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'search_keyword': 'str'
+}
+# Declared types of the typed Parquet copies: the same columns, with review counts
+# stored as integers (the CSV projection keeps them as text for to_numeric)
+RAW_TYPES = dict(RAW_DTYPES, review_count='int64')
+
+CLOSED_STATUSES = ['permanently_closed', 'permanently closed']
+DEFAULT_CHUNK_SIZE = 50000
+# Bytes read from a growing raw CSV per poll
+TAIL_READ_BYTES = 8 * 1024 * 1024
+
+def keyword_from_filename(path):
+    """
+    Recovers the search keyword from a raw file name (raw_{i}_{keyword}.csv).
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = re.match(r'raw_\d+_(.+)$', stem)
+    return match.group(1).replace('_', ' ') if match else ''
+
+def apply_cheap_filters(df, max_reviews=5):
+    """
+    Applies the filters that need no network access:
+    drops closed businesses, businesses with a website and those over max_reviews.
+    """
+    # 0. Filter Status
+    if 'status' in df.columns:
+        df = df[~df['status'].astype(str).str.lower().isin(CLOSED_STATUSES)]
+
+    # 1. Filter: No Website
+    if 'website' in df.columns:
+        df = df[df['website'].isna() | (df['website'].str.strip() == '')]
+
+    # 2. Filter: Review count
+    df = df.copy()
+    df['review_count'] = pd.to_numeric(df['review_count'], errors='coerce').fillna(0)
+    return df[df['review_count'] <= max_reviews]
+
+def read_raw_csv(path, chunksize=DEFAULT_CHUNK_SIZE):
+    return pd.read_csv(
+        path,
+        usecols=lambda c: c in RAW_DTYPES,
+        dtype=RAW_DTYPES,
+        chunksize=chunksize
+    )
+
+def iter_raw_chunks(path, keyword=None, chunksize=DEFAULT_CHUNK_SIZE, parquet_copy=False):
+    """
+    Reads a raw scraper CSV (or its Parquet copy) in chunks, loading only
+    the needed columns, and attaches the keyword of the job that produced it.
+    parquet_copy: also save a typed Parquet copy of a CSV, from the same read.
+    """
+    if path.endswith(".parquet"):
+        reader = storage.iter_parquet_chunks(path, RAW_DTYPES, chunksize)
+    else:
+        reader = read_raw_csv(path, chunksize)
+        if parquet_copy:
+            reader = write_parquet_copy(reader, path)
+    for chunk in reader:
+        yield tag_keyword(chunk, keyword)
+
+def tag_keyword(chunk, keyword):
+    """Attaches the search keyword to raw rows."""
+    # Older raw files were tagged in place; keep their keyword
+    if 'search_keyword' in chunk.columns:
+        chunk['search_keyword'] = chunk['search_keyword'].fillna(keyword or '')
+    else:
+        chunk['search_keyword'] = keyword or ''
+    return chunk
+
+def iter_raw_files(input_files, chunksize=DEFAULT_CHUNK_SIZE, parquet_copy=False):
+    """
+    Reads every raw input chunk by chunk. Unreadable files are reported and skipped.
+    input_files: a path, a list of paths, or a {path: keyword} dict.
+    parquet_copy: save a typed Parquet copy of every CSV while reading it (see write_parquet_copy).
+    """
+    if isinstance(input_files, str):
+        input_files = [input_files]
+    if not isinstance(input_files, dict):
+        input_files = {f: keyword_from_filename(f) for f in input_files}
+
+    for f, keyword in input_files.items():
+        try:
+            yield from iter_raw_chunks(f, keyword, chunksize, parquet_copy)
+        except Exception as e:
+            print(f"Error reading {f}: {e}")
+
+def complete_records_end(data):
+    """
+    Length of the longest prefix of CSV bytes made of whole records, i.e. up to
+    the last newline that is not inside a quoted field. Counting quote bytes is
+    safe for UTF-8, where multibyte characters never contain '"' or newlines.
+    """
+    end, pos, quoted = 0, 0, False
+    while True:
+        newline = data.find(b"\n", pos)
+        if newline < 0:
+            return end
+        if data.count(b'"', pos, newline) % 2:
+            quoted = not quoted
+        if not quoted:
+            end = newline + 1
+        pos = newline + 1
+
+class RawCsvTail:
+    """
+    Incrementally reads a raw scraper CSV while the scraper is still writing it.
+    Only complete records are parsed; a partially written last line (or a
+    quoted field still open across lines) stays buffered until the rest arrives.
+    """
+    def __init__(self, path, keyword=None, chunksize=DEFAULT_CHUNK_SIZE, max_read_bytes=TAIL_READ_BYTES):
+        self.path = path
+        self.keyword = keyword
+        self.chunksize = chunksize
+        self.max_read_bytes = max_read_bytes
+        self.offset = 0
+        self.header = None
+        self.buffer = b""
+        self.at_eof = True
+
+    def read(self, final=False):
+        """
+        Returns raw DataFrames for the records completed since the last call.
+        final: the writer has exited, so a last record without a newline is complete too.
+        at_eof is False while more data is waiting to be read.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(self.max_read_bytes)
+        except FileNotFoundError:
+            return []
+        self.offset += len(data)
+        self.at_eof = len(data) < self.max_read_bytes
+        self.buffer += data
+        final = final and self.at_eof
+
+        if self.header is None:
+            newline = self.buffer.find(b"\n")
+            if newline < 0:
+                return []
+            self.header, self.buffer = self.buffer[:newline + 1], self.buffer[newline + 1:]
+        end = len(self.buffer) if final else complete_records_end(self.buffer)
+        records, self.buffer = self.buffer[:end], self.buffer[end:]
+        if not records.strip():
+            return []
+        return [tag_keyword(chunk, self.keyword)
+                for chunk in read_raw_csv(io.BytesIO(self.header + records), self.chunksize)]
+
+def load_raw_leads(input_files, max_reviews=5, chunksize=DEFAULT_CHUNK_SIZE, parquet_copy=False):
+    """
+    Streams raw CSVs chunk by chunk, applies the cheap filters to each chunk
+    and concatenates only the surviving leads.
+    input_files: a path, a list of paths, or a {path: keyword} dict.
+    parquet_copy: save typed Parquet copies of the CSVs while reading them.
+    Returns: (leads DataFrame or None, total rows read)
+    """
+    kept = []
+    total_rows = 0
+    for chunk in iter_raw_files(input_files, chunksize, parquet_copy):
+        total_rows += len(chunk)
+        survivors = apply_cheap_filters(chunk, max_reviews)
+        if not survivors.empty:
+            kept.append(survivors)
+
+    if not kept:
+        return None, total_rows
+    return pd.concat(kept, ignore_index=True), total_rows
+
+def write_parquet_copy(chunks, csv_path):
+    """
+    Passes raw CSV chunks through while writing them to a typed Parquet file next
+    to the CSV, so later reads of the same file (resumed or repeated runs) only load
+    the projected columns and the conversion costs no extra parse.
+    The copy replaces an older one only once every chunk has been written;
+    if writing fails the chunks keep flowing without it.
+    """
+    out = storage.parquet_path(csv_path)
+    tmp = out + ".tmp"
+    schema = storage.arrow_schema(RAW_TYPES)
+    writer = storage.pq.ParquetWriter(tmp, schema)
+    complete = False
+    try:
+        for chunk in chunks:
+            if writer is not None:
+                try:
+                    writer.write_table(storage.pa.Table.from_pandas(storage.conform(chunk, RAW_TYPES),
+                                                                    schema=schema, preserve_index=False))
+                except Exception as e:
+                    print(f"Error writing the Parquet copy of {csv_path}: {e}")
+                    writer.close()
+                    writer = None
+                    os.remove(tmp)
+            yield chunk
+        complete = True
+    finally:
+        if writer is not None:
+            writer.close()
+            if complete:
+                os.replace(tmp, out)
+            else:
+                os.remove(tmp)
+
+def use_parquet_copies(input_files):
+    """
+    Maps {csv path: keyword} raw inputs to their Parquet copies where one is up to
+    date, so only new or changed CSVs are parsed again.
+    """
+    def fresh_copy(f):
+        out = storage.parquet_path(f)
+        return f.endswith(".csv") and os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(f)
+    mapped = {storage.parquet_path(f) if fresh_copy(f) else f: keyword for f, keyword in input_files.items()}
+    reused = sum(1 for f in mapped if f.endswith(".parquet"))
+    if reused:
+        print(f"Reusing {reused} Parquet copies of raw files.")
+    return mapped
@@ -0,0 +1,145 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+
+DEFAULT_QUEUE_PATH = "processed_data/jobs.sqlite"
+DEFAULT_LEASE_SECONDS = 3600
+
+def expand_manifest(manifest):
+    """
+    Expands a batch manifest into one job per city x keyword.
+    Manifest format:
+      {"campaign": "...", "defaults": {...}, "cities": [{"name", "lat", "lon", "radius"}], "keywords": [...]}
+    City entries may override any default (radius, depth, max_reviews...).
+    """
+    defaults = manifest.get("defaults", {})
+    campaign = manifest.get("campaign", "default")
+    jobs = []
+    for city in manifest.get("cities", []):
+        for kw in city.get("keywords", manifest.get("keywords", [])):
+            params = dict(defaults)
+            params.update({k: v for k, v in city.items() if k not in ("keywords",)})
+            params["keyword"] = kw
+            jobs.append({"campaign": campaign, "city": city.get("name", ""), "keyword": kw, "params": params})
+    return jobs
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class JobQueue:
+    """
+    SQLite-backed job queue shared by worker processes.
+    Jobs are claimed with a lease, which the worker renews while the job runs;
+    a job whose worker dies is handed out again once its lease expires.
+    """
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # isolation_level=None: transactions are managed explicitly
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, campaign TEXT, city TEXT, keyword TEXT, "
+            "params TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', worker TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def enqueue(self, jobs):
+        """Adds jobs (dicts from expand_manifest) to the queue. Returns the number added."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT INTO jobs (campaign, city, keyword, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(j["campaign"], j["city"], j["keyword"], json.dumps(j["params"]), now, now) for j in jobs]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return len(jobs)
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Atomically claims the next pending job (or one with an expired lease).
+        Returns: {"id", "campaign", "city", "keyword", "params", "attempts"} or None.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, campaign, city, keyword, params, attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "lease_until = ?, updated_at = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, row[0])
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return {"id": row[0], "campaign": row[1], "city": row[2], "keyword": row[3],
+                "params": json.loads(row[4]), "attempts": row[5] + 1}
+
+    def renew(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extends the lease of a running job held by worker.
+        Returns False if the job was handed to another worker in the meantime.
+        """
+        now = time.time()
+        cur = self.conn.execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (now + lease_seconds, now, job_id, worker)
+        )
+        return cur.rowcount > 0
+
+    def complete(self, job_id, worker, result=None):
+        """Marks a job done. Returns False (and changes nothing) if worker no longer holds it."""
+        cur = self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result or {}), time.time(), job_id, worker)
+        )
+        return cur.rowcount > 0
+
+    def fail(self, job_id, worker, error, max_attempts=3):
+        """
+        Marks a job failed, or returns it to the queue if it has attempts left.
+        Returns False (and changes nothing) if worker no longer holds it.
+        """
+        cur = self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+            "error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (max_attempts, str(error), time.time(), job_id, worker)
+        )
+        return cur.rowcount > 0
+
+    def status_counts(self):
+        """Returns {status: count}."""
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def jobs(self, status=None):
+        """Lists jobs, optionally filtered by status."""
+        query = "SELECT id, campaign, city, keyword, status, worker, attempts, result, error FROM jobs"
+        args = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        cols = ["id", "campaign", "city", "keyword", "status", "worker", "attempts", "result", "error"]
+        return [dict(zip(cols, row)) for row in self.conn.execute(query + " ORDER BY id", args)]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from names import clean_names_for_domain
+
+# Coordinate precision for the fallback key (4 decimals ~ 11m)
+COORD_PRECISION = 4
+
+def lead_keys(leads):
+    """
+    Builds a stable identity key for every lead.
+    Prefers the Maps place id (data_id / cid), then the Maps link,
+    and falls back to normalized title + rounded coordinates.
+    """
+    keys = pd.Series(None, index=leads.index, dtype=object)
+    for col, prefix in [('data_id', 'place:'), ('cid', 'cid:'), ('link', 'link:')]:
+        if col not in leads.columns:
+            continue
+        values = leads[col].astype(str).str.strip()
+        if col == 'link':
+            values = values.str.split('?').str[0]
+        present = leads[col].notna() & values.ne('')
+        keys = keys.where(keys.notna() | ~present, prefix + values)
+
+    if keys.isna().any():
+        name = clean_names_for_domain(leads['title']) if 'title' in leads.columns else ''
+        coords = ''
+        if 'latitude' in leads.columns and 'longitude' in leads.columns:
+            lat = pd.to_numeric(leads['latitude'], errors='coerce').round(COORD_PRECISION)
+            lon = pd.to_numeric(leads['longitude'], errors='coerce').round(COORD_PRECISION)
+            coords = '@' + lat.astype(str) + ',' + lon.astype(str)
+        keys = keys.fillna('name:' + name + coords)
+    return keys
+
+class LeadIndex:
+    """
+    Persistent SQLite index of leads processed in previous runs.
+    Lets the pipeline skip known places before WHOIS and template matching.
+    Safe to share between the threads of a streaming run.
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS leads ("
+            "key TEXT PRIMARY KEY, title TEXT, first_seen REAL NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def known(self, keys):
+        """Returns the subset of keys already present in the index."""
+        keys = list(set(keys))
+        found = set()
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT key FROM leads WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            found.update(r[0] for r in rows)
+        return found
+
+    def split_known(self, leads):
+        """
+        Separates new leads from those seen in earlier runs.
+        Returns: (new leads, number of already known leads)
+        """
+        keys = lead_keys(leads)
+        seen = keys.isin(self.known(keys))
+        return leads[~seen], int(seen.sum())
+
+    def add(self, leads):
+        """
+        Records leads as processed, including the duplicate listings
+        merged into them (duplicate_keys column), so neither comes back.
+        """
+        now = time.time()
+        keys = lead_keys(leads)
+        titles = leads['title'] if 'title' in leads.columns else [None] * len(leads)
+        rows = [(k, None if pd.isna(t) else str(t), now, now) for k, t in zip(keys, titles)]
+        if 'duplicate_keys' in leads.columns:
+            for dup_keys, t in zip(leads['duplicate_keys'], titles):
+                rows.extend((k, None if pd.isna(t) else str(t), now, now) for k in dup_keys)
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO leads (key, title, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET last_seen = excluded.last_seen",
+                rows
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def build_lead_index(conf):
+    """Opens the lead index configured in config/query.json, or None if disabled."""
+    index_path = conf.get("lead_index_path", "processed_data/lead_index.sqlite")
+    if not conf.get("skip_known_leads", True) or not index_path:
+        return None
+    return LeadIndex(index_path)
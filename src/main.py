@@ -1,12 +1,27 @@
 import os
-import subprocess
 import sys
 import argparse
 import json
 import glob
-import pandas as pd
-from filter_leads import filter_leads
-from upload_to_sheets import upload_to_sheets
+import itertools
+from filter_leads import filter_leads, check_pending_leads, settle_pending_leads, collect_pending_leads
+from scraper import run_scrape_jobs, LiveScrape, build_scraper_pool
+from ingest import keyword_from_filename, use_parquet_copies, iter_raw_files, DEFAULT_CHUNK_SIZE
+from storage import resolve_format
+from geo_tiling import plan_tiles, plan_bbox_tiles, plan_tiled_jobs, merge_tiles
+from upload_to_sheets import upload_to_sheets, sheet_options, open_sheets_sink
+from domain_checker import build_domain_checker, build_check_budget
+from lead_index import build_lead_index
+from dedupe import build_deduper, LeadDeduper
+from checkpoint import Checkpoint
+from job_queue import JobQueue, expand_manifest, DEFAULT_QUEUE_PATH
+from worker import run_local_workers, print_queue_status, JOBS_OUTPUT_DIR
+from service import run_service
+from stream_pipeline import stream_leads, resolve_pipeline_mode, DEFAULT_BATCH_SIZE, DEFAULT_QUEUE_SIZE
+from metrics import METRICS, RunProfiler
+
+REPORT_PATH = "processed_data/run_report.json"
+PROFILE_PATH = "processed_data/profile.prof"
 
 def load_config(config_path):
     """Loads configuration from JSON file."""
@@ -16,44 +31,6 @@ def load_config(config_path):
     with open(config_path, "r") as f:
         return json.load(f)
 
-def run_scrape_geo(keyword, lat, lon, radius, output_raw, lang="pl", depth=1, email=False):
-    """Runs the Docker-based scraper in GEO mode."""
-    
-    # In geo mode, the scraper takes the query as the keyword (e.g., "dentist") 
-    # and restricts it to the geo-fence.
-    
-    # We write the single keyword to the input file
-    query_file = "raw_data/queries.txt"
-    with open(query_file, "w") as f:
-        f.write(keyword + "\n")
-
-    geo_string = f"{lat},{lon}"
-    
-    print(f"--- Starting GEO Scrape for: '{keyword}' around {geo_string} (r={radius}m) ---")
-    
-    cmd = [
-        "docker", "run", "--rm",
-        "-v", f"{os.getcwd()}/raw_data:/data",
-        "ghcr.io/gzyms69/google-maps-scraper:latest",
-        "-input", "/data/queries.txt",
-        "-results", f"/data/{os.path.basename(output_raw)}",
-        "-lang", lang,
-        "-geo", geo_string,
-        "-radius", str(radius),
-        "-depth", str(depth)
-    ]
-    
-    if email:
-        cmd.append("-email")
-
-    try:
-        subprocess.run(cmd, check=True)
-        print("Scrape completed successfully.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error during scrape: {e}")
-        # We don't exit here so other keywords can proceed
-        pass
-
 def main():
     # 0. Load JSON Config
     CONFIG_PATH = "config/query.json"
@@ -61,12 +38,69 @@ def main():
 
     parser = argparse.ArgumentParser(description="LeadFinder: Google Maps Scraper & Filter")
     parser.add_argument("--skip-scrape", action="store_true", help="Skip scrape")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last run from its checkpoint instead of starting over")
+    parser.add_argument("--enqueue", metavar="MANIFEST",
+                        help="Expand a batch manifest (cities x keywords) into the job queue")
+    parser.add_argument("--worker", action="store_true", help="Run queued jobs until the queue is empty")
+    parser.add_argument("--workers", type=int, default=1, help="Number of local worker processes")
+    parser.add_argument("--wait", action="store_true", help="Keep workers polling for new jobs")
+    parser.add_argument("--queue-status", action="store_true", help="Show job queue status")
+    parser.add_argument("--check-pending", action="store_true",
+                        help="Check domains left 'Pending' by domain_check_limit/budget and update the sheet")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream leads through filtering, domain checks and upload in micro-batches")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the local HTTP service (classify, check-domain, jobs, upload)")
+    parser.add_argument("--port", type=int, help="Port for --serve (default: service_port or 8765)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Profile the run, worker threads included, with cProfile (saved to {PROFILE_PATH})")
     
     args = parser.parse_args()
 
+    # Job queue modes (regional campaigns)
+    QUEUE_PATH = conf.get("job_queue_path", DEFAULT_QUEUE_PATH)
+    if args.enqueue:
+        manifest = load_config(args.enqueue)
+        added = JobQueue(QUEUE_PATH).enqueue(expand_manifest(manifest))
+        print(f"Enqueued {added} jobs into {QUEUE_PATH}")
+        return
+    if args.worker:
+        run_local_workers(QUEUE_PATH, conf, args.workers, args.wait)
+        print_queue_status(QUEUE_PATH)
+        return
+    if args.queue_status:
+        print_queue_status(QUEUE_PATH)
+        return
+    if args.serve:
+        run_service(conf, args.port)
+        return
+
+    # Instrumentation: a JSON run report always, a cProfile dump with --profile
+    profiler = RunProfiler() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        run_pipeline(args, conf)
+    finally:
+        if profiler:
+            profiler.disable()
+            stats = profiler.dump(PROFILE_PATH)
+            print(f"--- Profile saved to: {PROFILE_PATH} (top functions by cumulative time, all threads) ---")
+            stats.sort_stats("cumulative").print_stats(20)
+        METRICS.print_summary()
+        METRICS.write_report(REPORT_PATH)
+
+def run_pipeline(args, conf):
+    """Runs scrape -> filter -> upload for config/query.json."""
     # Settings
     RAW_DIR = "raw_data"
+    TILES_DIR = "raw_data/tiles"
+    POOL_DIR = "raw_data/pool"
     FILTERED_CSV = "processed_data/filtered_leads.csv"
+    FAILED_CSV = "processed_data/filtered_leads_failed.csv"
+    PENDING_LEADS_CSV = "processed_data/pending_leads.csv"
+    PENDING_CSV = "processed_data/pending_checked.csv"
     CREDS = "config/service_account.json"
     
     # Spreadsheet ID from config
@@ -74,64 +108,221 @@ def main():
     if not SHEET_ID:
         print("Error: 'spreadsheet_id' not found in config/query.json")
         sys.exit(1)
+
+    storage_format = resolve_format(conf.get("storage_format"))
+    pipeline_mode = "stream" if args.stream else resolve_pipeline_mode(conf.get("pipeline_mode"))
+    if args.check_pending:
+        # On-demand pass over the leads left Pending by earlier runs and queued jobs
+        collect_pending_leads(PENDING_LEADS_CSV, sorted(glob.glob(f"{JOBS_OUTPUT_DIR}/job_*_pending.csv")))
+        with METRICS.stage("check_pending") as info:
+            updated = check_pending_leads(PENDING_LEADS_CSV, build_domain_checker(conf),
+                                          build_check_budget(conf), FILTERED_CSV, storage_format)
+            info["rows_out"] = 0 if updated is None else len(updated)
+        if updated is not None:
+            updated.to_csv(PENDING_CSV, index=False)
+            print(f"--- Updating {len(updated)} rows in Google Sheets ---")
+            # Rows are already in the sheet: overwrite them by key
+            options = dict(sheet_options(conf), mode="upsert")
+            if not upload_to_sheets(PENDING_CSV, CREDS, SHEET_ID, **options):
+                # Checked rows stay in the pending file and are uploaded by the next --check-pending
+                sys.exit(1)
+            settle_pending_leads(PENDING_LEADS_CSV)
+        return
     
+    keywords = conf.get("keywords", [])
+    if not keywords and conf.get("query"):
+         # Fallback to single query if keywords missing
+         keywords = [conf.get("query")]
+
+    # Create unique filename for each keyword run
+    keyword_files = {kw: f"{RAW_DIR}/raw_{i}_{kw.replace(' ', '_')}.csv" for i, kw in enumerate(keywords)}
+
+    # Completed units of work are journaled so --resume can pick up where a run died
+    checkpoint = Checkpoint(resume=args.resume)
+    if args.resume:
+        print(f"--- Resuming from checkpoint ({len(checkpoint.done)} completed units) ---")
+
     # 1. Scrape Logic
+    live_scrape = None
+    tile_radius = conf.get("tile_radius")
     if not args.skip_scrape:
-        # Clear old raw data to avoid mixing searches
-        for f in glob.glob(f"{RAW_DIR}/raw_*.csv"):
-            os.remove(f)
-
-        keywords = conf.get("keywords", [])
-        if not keywords and conf.get("query"):
-             # Fallback to single query if keywords missing
-             keywords = [conf.get("query")]
-
-        for i, kw in enumerate(keywords):
-            # Create unique filename for each keyword run
-            output_file = f"{RAW_DIR}/raw_{i}_{kw.replace(' ', '_')}.csv"
-            
-            run_scrape_geo(
-                keyword=kw,
-                lat=conf.get("lat"),
-                lon=conf.get("lon"),
-                radius=conf.get("radius", 5000),
-                output_raw=output_file,
-                lang=conf.get("language", "pl"),
-                depth=conf.get("depth", 1),
-                email=conf.get("email_scrape", False)
-            )
-
-            # Tag the raw data with the keyword that found it
-            if os.path.exists(output_file):
-                try:
-                    df_raw = pd.read_csv(output_file)
-                    df_raw['search_keyword'] = kw
-                    df_raw.to_csv(output_file, index=False)
-                except Exception as e:
-                    print(f"Warning: Could not tag {output_file} with keyword: {e}")
+        if not args.resume:
+            # Clear old raw data to avoid mixing searches
+            old_files = glob.glob(f"{RAW_DIR}/raw_*.csv") + glob.glob(f"{RAW_DIR}/raw_*.parquet")
+            for f in old_files + glob.glob(f"{TILES_DIR}/raw_*.csv"):
+                os.remove(f)
+
+        scrape_args = {
+            "lang": conf.get("language", "pl"),
+            "depth": conf.get("depth", 1),
+            "email": conf.get("email_scrape", False)
+        }
+        if tile_radius:
+            # Large areas are split into cells, one scrape per cell x keyword
+            if conf.get("bbox"):
+                tiles = plan_bbox_tiles(*conf["bbox"], tile_radius)
+            else:
+                tiles = plan_tiles(conf.get("lat"), conf.get("lon"), conf.get("radius", 5000), tile_radius)
+            print(f"--- Geo tiling: {len(tiles)} cells of r={tile_radius}m x {len(keyword_files)} keywords ---")
+            all_jobs = plan_tiled_jobs(keyword_files, tiles, tile_radius, TILES_DIR, **scrape_args)
+        else:
+            all_jobs = [
+                dict(scrape_args, keyword=kw, lat=conf.get("lat"), lon=conf.get("lon"),
+                     radius=conf.get("radius", 5000), output_raw=output_file)
+                for kw, output_file in keyword_files.items()
+            ]
+
+        jobs = [job for job in all_jobs if not checkpoint.is_done("scrape", job["output_raw"])]
+        if len(jobs) < len(all_jobs):
+            print(f"Skipping {len(all_jobs) - len(jobs)} jobs already scraped.")
+        scrape_options = {
+            "concurrency": conf.get("scrape_concurrency", 1),
+            "timeout": conf.get("scrape_timeout"),
+            "memory_per_job_mb": conf.get("scrape_memory_per_job_mb", 1024)
+        }
+
+        # Optional pool of long-lived scrapers taking batches of queries (stopped at exit)
+        scrape_options["pool"] = build_scraper_pool(conf, POOL_DIR) if jobs else None
+
+        def mark_scraped(job, ok, seconds):
+            if ok:
+                checkpoint.mark_done("scrape", job["output_raw"])
+
+        if (pipeline_mode == "stream" and conf.get("live_scrape", True) and jobs
+                and not checkpoint.is_done("filter")):
+            # Scrapes run in step 3, which filters their rows while they are being written
+            live_scrape = LiveScrape(jobs, on_result=mark_scraped, **scrape_options)
+        else:
+            with METRICS.stage("scrape", len(jobs)) as info:
+                results = run_scrape_jobs(jobs, **scrape_options)
+                info["rows_out"] = sum(1 for _, ok, _ in results if ok)
+            for result in results:
+                mark_scraped(*result)
+            if scrape_options["pool"] is not None:
+                scrape_options["pool"].close()
+
+            if tile_radius:
+                merge_tiles(keyword_files, TILES_DIR)
 
     # 2. Merge Raw Data
-    # Since we ran multiple scrapes (one per keyword), we need to merge them for filtering
-    all_files = glob.glob(f"{RAW_DIR}/raw_*.csv")
-    if not all_files:
-        print("No raw data found to process.")
-        sys.exit(1)
-        
-    print(f"--- Merging {len(all_files)} raw data files ---")
-    
+    if live_scrape is not None:
+        # Only jobs finished by an earlier (resumed) run have complete files; the rest are tailed
+        input_files = {job["output_raw"]: job["keyword"] for job in all_jobs
+                       if job not in jobs and os.path.exists(job["output_raw"])}
+    else:
+        # Since we ran multiple scrapes (one per keyword), we need to merge them for filtering
+        all_files = glob.glob(f"{RAW_DIR}/raw_*.csv")
+        if not all_files:
+            print("No raw data found to process.")
+            sys.exit(1)
+
+        print(f"--- Merging {len(all_files)} raw data files ---")
+        # The keyword comes from the job that produced each file; unknown files fall back to their name
+        file_keywords = {f: kw for kw, f in keyword_files.items()}
+        input_files = {f: file_keywords.get(f) or keyword_from_filename(f) for f in all_files}
+        if storage_format == "parquet" and pipeline_mode == "batch":
+            # Typed columnar copies saved by an earlier read (e.g. before --resume) skip CSV parsing
+            input_files = use_parquet_copies(input_files)
+
+
     # 3. Filter (Updated for DSA V2 & Forced Template)
     print(f"--- Filtering Leads (Max Reviews: {conf.get('max_reviews', 5)}) ---")
     forced_template = conf.get("template")
-    filter_leads(
-        input_files=all_files, 
-        output_file=FILTERED_CSV, 
-        max_reviews=conf.get('max_reviews', 5),
-        forced_template=forced_template
-    )
+    domain_checker = build_domain_checker(conf)
+    lead_index = build_lead_index(conf)
+    # Batch-mode leads, added to the lead index once they are in the sheet
+    unindexed = None
+    if checkpoint.is_done("filter"):
+        lead_count = checkpoint.get("filter").get("leads", 0)
+        print(f"Filtering already completed ({lead_count} leads).")
+        if pipeline_mode == "batch":
+            unindexed = checkpoint.load_frame("templates")
+    elif pipeline_mode == "stream":
+        # Leads reach the CSV and the sheet batch by batch while later ones are still being checked
+        batch_size = conf.get("stream_batch_size", DEFAULT_BATCH_SIZE)
+        print(f"--- Streaming leads in batches of {batch_size} ---")
+        sheets_sink = open_sheets_sink(
+            CREDS, SHEET_ID, FAILED_CSV,
+            flush_rows=conf.get("stream_flush_rows", 500),
+            flush_seconds=conf.get("stream_flush_seconds", 15),
+            **sheet_options(conf)
+        )
+        chunks = iter_raw_files(input_files, batch_size)
+        deduper = build_deduper(conf)
+        if live_scrape is not None:
+            chunks = itertools.chain(chunks, live_scrape.chunks(batch_size))
+            if deduper is None and tile_radius:
+                # Overlapping cells are streamed before merge_tiles could drop their shared places
+                deduper = LeadDeduper(similarity=1.0)
+        lead_count, upload_ok = stream_leads(
+            chunks,
+            output_file=FILTERED_CSV,
+            domain_checker=domain_checker,
+            sheets_sink=sheets_sink,
+            storage_format=storage_format,
+            # Leads written before the interruption are skipped via the lead index, so keep them
+            append=args.resume,
+            max_reviews=conf.get('max_reviews', 5),
+            forced_template=forced_template,
+            lead_index=lead_index,
+            deduper=deduper,
+            domain_limit=conf.get("domain_check_limit"),
+            domain_budget=build_check_budget(conf),
+            pending_file=PENDING_LEADS_CSV,
+            queue_size=conf.get("stream_queue_size", DEFAULT_QUEUE_SIZE)
+        )
+        if live_scrape is not None:
+            if live_scrape.pool is not None:
+                live_scrape.pool.close()
+            if tile_radius:
+                merge_tiles(keyword_files, TILES_DIR)
+        checkpoint.mark_done("filter", leads=lead_count)
+        if sheets_sink is not None:
+            # Failed rows were saved to FAILED_CSV and are retried below
+            checkpoint.mark_done("upload", ok=upload_ok)
+    else:
+        unindexed = filter_leads(
+            input_files=input_files,
+            output_file=FILTERED_CSV,
+            max_reviews=conf.get('max_reviews', 5),
+            forced_template=forced_template,
+            domain_checker=domain_checker,
+            chunksize=conf.get("ingest_chunk_size", DEFAULT_CHUNK_SIZE),
+            lead_index=lead_index,
+            checkpoint=checkpoint,
+            storage_format=storage_format,
+            deduper=build_deduper(conf),
+            domain_limit=conf.get("domain_check_limit"),
+            domain_budget=build_check_budget(conf),
+            pending_file=PENDING_LEADS_CSV,
+            # Written while filtering reads the CSVs, and reused by later runs over the same files
+            raw_parquet_copy=storage_format == "parquet"
+        )
+        lead_count = 0 if unindexed is None else len(unindexed)
+        checkpoint.mark_done("filter", leads=lead_count)
 
     # 4. Upload
-    print("--- Uploading to Google Sheets ---")
-    upload_to_sheets(FILTERED_CSV, CREDS, SHEET_ID)
+    if not lead_count:
+        # Don't re-upload the previous run's CSV
+        print("--- Nothing new to upload ---")
+        return
+
+    upload = checkpoint.get("upload") if checkpoint.is_done("upload") else None
+    if upload and upload.get("ok"):
+        print("--- Upload already completed ---")
+    else:
+        # A resumed upload only retries the rows that failed last time
+        upload_csv = FAILED_CSV if upload and os.path.exists(FAILED_CSV) else FILTERED_CSV
+        print(f"--- Uploading to Google Sheets ({upload_csv}) ---")
+        with METRICS.stage("upload", lead_count):
+            ok = upload_to_sheets(upload_csv, CREDS, SHEET_ID, failed_file=FAILED_CSV, **sheet_options(conf))
+        checkpoint.mark_done("upload", ok=ok)
+        if not ok:
+            print("Upload incomplete. Run again with --resume to retry the failed rows.")
+            sys.exit(1)
+    if lead_index is not None and unindexed is not None:
+        # Only now are they in the sheet, so a failed upload leaves them to the next run
+        lead_index.add(unindexed)
 
     print("\n--- ALL DONE ---")
     print(f"Check your spreadsheet: https://docs.google.com/spreadsheets/d/{SHEET_ID}")
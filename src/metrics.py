@@ -0,0 +1,169 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30]
+
+class RunMetrics:
+    """
+    Collects per-stage timings, row counts, counters and latency histograms
+    for one run, and writes them as a JSON report.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.stages = []
+        self.counters = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+        # Stages currently open, per thread
+        self.local = threading.local()
+        self.main_stages = []
+
+    def open_stages(self):
+        if threading.current_thread() is threading.main_thread():
+            return self.main_stages
+        if not hasattr(self.local, "stages"):
+            self.local.stages = []
+        return self.local.stages
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Times a pipeline stage. The yielded dict can be updated with rows_out
+        (or any other detail) before the block ends.
+        """
+        info = {"stage": name, "rows_in": rows_in, "rows_out": None}
+        open_stages = self.open_stages()
+        with self.lock:
+            open_stages.append(info)
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            info["seconds"] = round(time.perf_counter() - start, 3)
+            with self.lock:
+                open_stages.remove(info)
+                self.stages.append(info)
+
+    def count(self, name, n=1):
+        """
+        Adds to a run-wide counter and to the counters of the innermost stage open
+        on this thread. Pool threads (domain lookups, sheet writers, streaming stages)
+        have no stage of their own and count towards the main thread's stage.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            open_stages = getattr(self.local, "stages", None) or self.main_stages
+            if open_stages:
+                counters = open_stages[-1].setdefault("counters", {})
+                counters[name] = counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        """Records one sample (e.g. a request latency) for a histogram."""
+        with self.lock:
+            self.samples.setdefault(name, []).append(value)
+
+    def histogram(self, name):
+        values = sorted(self.samples.get(name, []))
+        if not values:
+            return {"count": 0}
+        buckets = {}
+        for bound in LATENCY_BUCKETS + [float("inf")]:
+            label = f"<={bound}" if bound != float("inf") else f">{LATENCY_BUCKETS[-1]}"
+            buckets[label] = 0
+        for v in values:
+            for bound in LATENCY_BUCKETS:
+                if v <= bound:
+                    buckets[f"<={bound}"] += 1
+                    break
+            else:
+                buckets[f">{LATENCY_BUCKETS[-1]}"] += 1
+        pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 4)
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 4),
+            "p50": pick(0.5),
+            "p90": pick(0.9),
+            "p99": pick(0.99),
+            "max": round(values[-1], 4),
+            "buckets": buckets
+        }
+
+    def report(self):
+        with self.lock:
+            stages = list(self.stages)
+            counters = dict(self.counters)
+            names = list(self.samples)
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "total_seconds": round(time.time() - self.started, 3),
+            "stages": stages,
+            "counters": counters,
+            "histograms": {name: self.histogram(name) for name in names}
+        }
+
+    def write_report(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Run report saved to: {path}")
+
+    def print_summary(self):
+        print("--- Stage Timings ---")
+        for s in self.stages:
+            rows = ""
+            if s.get("rows_in") is not None or s.get("rows_out") is not None:
+                rows = f" ({s.get('rows_in')} -> {s.get('rows_out')} rows)"
+            print(f"  {s['stage']:<12} {s['seconds']:>9.2f}s{rows}")
+
+class RunProfiler:
+    """
+    cProfile over every thread of the run. A cProfile.Profile only sees the thread
+    that enabled it, so each thread started while profiling (domain lookup pools,
+    streaming stages, sheet writers) gets its own profiler and the stats are merged.
+    """
+    def __init__(self):
+        self.profiles = [cProfile.Profile()]
+        self.lock = threading.Lock()
+
+    def profile_thread(self, frame, event, arg):
+        # Installed with threading.setprofile: runs once as each new thread starts
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles through sys.monitoring, which already covers every thread
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def enable(self):
+        threading.setprofile(self.profile_thread)
+        self.profiles[0].enable()
+
+    def disable(self):
+        threading.setprofile(None)
+        self.profiles[0].disable()
+
+    def dump(self, path):
+        """Saves the merged stats of all threads to path. Returns the pstats.Stats."""
+        with self.lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        stats.dump_stats(path)
+        return stats
+
+# Process-wide metrics for the current run
+METRICS = RunMetrics()
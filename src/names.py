@@ -0,0 +1,28 @@
+import re
+import pandas as pd
+
+# Polish character mapping
+POLISH_TO_ASCII = str.maketrans({
+    'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
+    'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z'
+})
+
+def clean_name_for_domain(name):
+    """
+    Cleans business name for domain checking:
+    - Lowers case
+    - Converts Polish characters to ASCII
+    - Removes all non-alphanumeric characters
+    """
+    if not name or pd.isna(name):
+        return ""
+    name = name.lower().translate(POLISH_TO_ASCII)
+    # Remove everything except a-z and 0-9
+    return re.sub(r'[^a-z0-9]', '', name)
+
+def clean_names_for_domain(names):
+    """Column version of clean_name_for_domain."""
+    return (names.str.lower()
+                 .str.translate(POLISH_TO_ASCII)
+                 .str.replace(r'[^a-z0-9]', '', regex=True)
+                 .fillna(''))
@@ -0,0 +1,113 @@
+import http.client
+import json
+import queue
+import time
+from urllib.parse import urlparse, quote
+from metrics import METRICS
+
+# RDAP base URLs per TLD (see the IANA RDAP bootstrap registry)
+DEFAULT_RDAP_SERVERS = {
+    "pl": "https://rdap.dns.pl",
+    "com": "https://rdap.verisign.com/com/v1"
+}
+DEFAULT_RDAP_TIMEOUT = 10
+
+# Errors that mean a pooled keep-alive connection went stale
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                           BrokenPipeError, ConnectionResetError)
+
+class RdapRegistry:
+    """
+    One RDAP server with a pool of keep-alive connections,
+    so consecutive lookups skip the TCP/TLS handshake.
+    """
+    def __init__(self, base_url, pool_size=4, timeout=DEFAULT_RDAP_TIMEOUT):
+        url = urlparse(base_url)
+        self.scheme = url.scheme or "https"
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=max(1, pool_size))
+
+    def connect(self):
+        METRICS.count("rdap_connections_opened")
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn, response):
+        if response.will_close:
+            conn.close()
+            return
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def get(self, path):
+        """GET request returning (status, body). A stale pooled connection is retried once."""
+        for attempt in range(2):
+            conn = self.acquire()
+            try:
+                conn.request("GET", self.prefix + path, headers={"Accept": "application/rdap+json"})
+                response = conn.getresponse()
+                body = response.read()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            self.release(conn, response)
+            return response.status, body
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+class RdapClient:
+    """
+    Domain availability over RDAP: structured JSON answers instead of
+    parsing free-text WHOIS output. 404 means the domain is not registered.
+    """
+    def __init__(self, servers=None, pool_size=4, timeout=DEFAULT_RDAP_TIMEOUT):
+        urls = dict(DEFAULT_RDAP_SERVERS)
+        urls.update(servers or {})
+        self.registries = {tld: RdapRegistry(url, pool_size, timeout) for tld, url in urls.items()}
+
+    def lookup(self, domain):
+        """Returns 'Available', 'Registered', or 'Check Manually'."""
+        registry = self.registries.get(domain.rsplit(".", 1)[-1])
+        if registry is None:
+            return "Check Manually"
+        METRICS.count("rdap_requests")
+        start = time.perf_counter()
+        try:
+            status, body = registry.get("/domain/" + quote(domain))
+            if status == 404:
+                return "Available"
+            if status == 200 and json.loads(body).get("objectClassName") == "domain":
+                return "Registered"
+            if status == 429:
+                METRICS.count("rdap_throttled")
+            return "Check Manually"
+        except Exception:
+            return "Check Manually"
+        finally:
+            METRICS.observe("rdap_latency_seconds", time.perf_counter() - start)
+
+    def close(self):
+        for registry in self.registries.values():
+            registry.close()
@@ -0,0 +1,378 @@
+import atexit
+import os
+import queue
+import re
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
+from ingest import RawCsvTail, DEFAULT_CHUNK_SIZE
+from metrics import METRICS
+
+SCRAPER_IMAGE = "ghcr.io/gzyms69/google-maps-scraper:latest"
+# How often growing result files are checked in live mode, in seconds
+DEFAULT_POLL_SECONDS = 1.0
+
+# Scraper worker pool: long-lived containers that run batches of queries.
+# Templates are formatted with name, data_dir, input_file, results_file, geo, radius, lang and depth;
+# "-email" is appended to the run command for jobs that scrape emails.
+DEFAULT_POOL_COMMANDS = {
+    "start": ["docker", "run", "-d", "--rm", "--name", "{name}", "-v", "{data_dir}:/data",
+              "--entrypoint", "sleep", SCRAPER_IMAGE, "infinity"],
+    "run": ["docker", "exec", "{name}", "google-maps-scraper",
+            "-input", "/data/{input_file}", "-results", "/data/{results_file}",
+            "-lang", "{lang}", "-geo", "{geo}", "-radius", "{radius}", "-depth", "{depth}"],
+    "stop": ["docker", "rm", "-f", "{name}"]
+}
+DEFAULT_POOL_BATCH_SIZE = 10
+# Tags each input line so results can be routed back to their job (scraper's input_id column)
+INPUT_ID_SEPARATOR = " #!# "
+
+def container_name_for(output_raw):
+    """Docker-safe container name derived from the raw output file."""
+    stem = os.path.splitext(os.path.basename(output_raw))[0]
+    return "leadfinder-" + re.sub(r'[^a-zA-Z0-9_.-]', '', stem)[:60] + f"-{os.getpid()}"
+
+def run_scrape_geo(keyword, lat, lon, radius, output_raw, lang="pl", depth=1, email=False, timeout=None):
+    """
+    Runs the Docker-based scraper in GEO mode.
+    Returns True if the scrape completed successfully.
+    """
+    # In geo mode, the scraper takes the query as the keyword (e.g., "dentist")
+    # and restricts it to the geo-fence.
+
+    # Each job gets its own input file so parallel scrapes don't clobber each other
+    raw_dir = os.path.dirname(output_raw) or "."
+    stem = os.path.splitext(os.path.basename(output_raw))[0]
+    query_file = os.path.join(raw_dir, f"queries_{stem}.txt")
+    with open(query_file, "w") as f:
+        f.write(keyword + "\n")
+
+    geo_string = f"{lat},{lon}"
+    container_name = container_name_for(output_raw)
+
+    print(f"--- Starting GEO Scrape for: '{keyword}' around {geo_string} (r={radius}m) ---")
+
+    cmd = [
+        "docker", "run", "--rm",
+        "--name", container_name,
+        "-v", f"{os.path.abspath(raw_dir)}:/data",
+        SCRAPER_IMAGE,
+        "-input", f"/data/{os.path.basename(query_file)}",
+        "-results", f"/data/{os.path.basename(output_raw)}",
+        "-lang", lang,
+        "-geo", geo_string,
+        "-radius", str(radius),
+        "-depth", str(depth)
+    ]
+
+    if email:
+        cmd.append("-email")
+
+    try:
+        subprocess.run(cmd, check=True, timeout=timeout)
+        print(f"Scrape completed successfully: '{keyword}'")
+        return True
+    except subprocess.TimeoutExpired:
+        print(f"Error during scrape: '{keyword}' timed out after {timeout}s")
+        # Killing the docker CLI leaves the container running
+        subprocess.run(["docker", "kill", container_name], capture_output=True)
+        return False
+    except subprocess.CalledProcessError as e:
+        print(f"Error during scrape: {e}")
+        # We don't exit here so other keywords can proceed
+        return False
+    finally:
+        if os.path.exists(query_file):
+            os.remove(query_file)
+
+def max_parallel_scrapes(requested, memory_per_job_mb=1024):
+    """
+    Caps the number of concurrent scraper containers by CPU count
+    and physical memory (each headless browser needs roughly memory_per_job_mb).
+    """
+    limit = os.cpu_count() or 1
+    try:
+        total_mb = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+        limit = min(limit, max(1, total_mb // max(1, memory_per_job_mb)))
+    except (ValueError, OSError, AttributeError):
+        pass
+    return max(1, min(int(requested), limit))
+
+def timed_scrape(job, timeout=None):
+    """Runs one scrape job. Returns: (job, succeeded, seconds)"""
+    started = time.monotonic()
+    ok = run_scrape_geo(timeout=timeout, **job)
+    return job, ok, time.monotonic() - started
+
+def print_scrape_summary(results):
+    succeeded = sum(1 for _, ok, _ in results if ok)
+    print(f"--- Scrape Summary: {succeeded}/{len(results)} jobs succeeded ---")
+    for job, ok, seconds in results:
+        print(f"  [{'OK' if ok else 'FAILED'}] '{job['keyword']}' -> "
+              f"{os.path.basename(job['output_raw'])} ({seconds:.0f}s)")
+
+def scrape_workers(concurrency, memory_per_job_mb):
+    workers = max_parallel_scrapes(concurrency, memory_per_job_mb)
+    if workers < concurrency:
+        print(f"Limiting scrape concurrency to {workers} (requested {concurrency})")
+    return workers
+
+def run_scrape_jobs(jobs, concurrency=1, timeout=None, memory_per_job_mb=1024, pool=None):
+    """
+    Runs scrape jobs (dicts of run_scrape_geo arguments) in parallel,
+    or in batches on a ScraperPool.
+    Returns: list of (job, succeeded, seconds) in job order.
+    """
+    if pool is not None:
+        results = [future.result() for future in pool.submit(jobs)]
+    else:
+        workers = scrape_workers(concurrency, memory_per_job_mb)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda job: timed_scrape(job, timeout), jobs))
+    print_scrape_summary(results)
+    return results
+
+def split_results(results_file, jobs):
+    """
+    Routes a batch's combined results to each job's output_raw by input_id
+    (the job's position in the batch). Returns the number of rows per job.
+    """
+    try:
+        df = pd.read_csv(results_file, dtype=str)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        df = pd.DataFrame()
+    ids = df.pop('input_id') if 'input_id' in df.columns else None
+
+    counts = []
+    for i, job in enumerate(jobs):
+        if ids is not None:
+            rows = df[ids.str.strip() == str(i)]
+        else:
+            # Untagged output can only be attributed to a single-query batch
+            rows = df if len(jobs) == 1 else df.iloc[0:0]
+        if rows.columns.empty:
+            counts.append(0)
+            continue
+        os.makedirs(os.path.dirname(job["output_raw"]) or ".", exist_ok=True)
+        # Written aside and renamed, so a live reader never sees a partial file
+        tmp = job["output_raw"] + ".tmp"
+        rows.to_csv(tmp, index=False)
+        os.replace(tmp, job["output_raw"])
+        counts.append(len(rows))
+    return counts
+
+class ScraperWorker:
+    """One long-lived scraper (by default a Docker container) that runs batches of queries."""
+    def __init__(self, name, data_dir, commands):
+        self.name = name
+        self.data_dir = data_dir
+        self.commands = commands
+        self.started = False
+
+    def command(self, key, **values):
+        values = dict(values, name=self.name, data_dir=self.data_dir)
+        return [part.format(**values) for part in self.commands.get(key) or []]
+
+    def start(self):
+        if self.started:
+            return
+        cmd = self.command("start")
+        if cmd:
+            print(f"--- Starting scraper worker {self.name} ---")
+            subprocess.run(cmd, check=True, capture_output=True)
+        self.started = True
+
+    def stop(self):
+        if not self.started:
+            return
+        cmd = self.command("stop")
+        if cmd:
+            subprocess.run(cmd, capture_output=True)
+        self.started = False
+
+    def run_batch(self, batch_id, jobs, timeout=None):
+        """
+        Scrapes every job of a batch (same area and flags) in one scraper run.
+        Returns True if the scraper exited successfully.
+        """
+        input_file = f"{batch_id}.txt"
+        results_file = f"{batch_id}.csv"
+        with open(os.path.join(self.data_dir, input_file), "w", encoding="utf-8") as f:
+            for i, job in enumerate(jobs):
+                f.write(f"{job['keyword']}{INPUT_ID_SEPARATOR}{i}\n")
+
+        first = jobs[0]
+        cmd = self.command(
+            "run", input_file=input_file, results_file=results_file, geo=f"{first['lat']},{first['lon']}",
+            radius=first["radius"], lang=first.get("lang", "pl"), depth=first.get("depth", 1)
+        )
+        if first.get("email"):
+            cmd.append("-email")
+
+        keywords = ", ".join(f"'{job['keyword']}'" for job in jobs)
+        print(f"--- {self.name}: scraping {len(jobs)} queries ({keywords}) ---")
+        try:
+            self.start()
+            subprocess.run(cmd, check=True, timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            print(f"Error during scrape: batch {batch_id} timed out after {timeout}s")
+            # The scraper keeps running inside a kept-alive worker; replace the worker
+            self.stop()
+            return False
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Error during scrape: {e}")
+            self.stop()
+            return False
+        finally:
+            os.remove(os.path.join(self.data_dir, input_file))
+
+class ScraperPool:
+    """
+    Runs scrape jobs on a few long-lived scraper workers instead of one
+    `docker run --rm` per job, so container and browser start-up is paid per
+    batch rather than per keyword. Jobs sharing the area and scraper flags are
+    batched into one multi-line input file (`query #!# id`), and the combined
+    results are split back into each job's output_raw by input_id.
+    """
+    def __init__(self, data_dir, size=2, batch_size=DEFAULT_POOL_BATCH_SIZE, commands=None, timeout=None):
+        self.data_dir = os.path.abspath(data_dir)
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.batch_size = max(1, int(batch_size))
+        self.timeout = timeout
+        commands = dict(DEFAULT_POOL_COMMANDS, **(commands or {}))
+        self.workers = [ScraperWorker(f"leadfinder-pool-{i}-{os.getpid()}", self.data_dir, commands)
+                        for i in range(max(1, int(size)))]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.executor = ThreadPoolExecutor(max_workers=len(self.workers))
+        self.batches_run = 0
+        # Containers must not outlive the run, even if it dies
+        atexit.register(self.close)
+
+    def batches(self, jobs):
+        """Groups jobs that can share one scraper run, batch_size queries at a time."""
+        groups = {}
+        for job in jobs:
+            key = (job["lat"], job["lon"], job["radius"], job.get("lang"), job.get("depth"), job.get("email"))
+            groups.setdefault(key, []).append(job)
+        for group in groups.values():
+            for i in range(0, len(group), self.batch_size):
+                yield group[i:i + self.batch_size]
+
+    def submit(self, jobs):
+        """
+        Queues jobs in batches. Returns one Future per job (in job order)
+        resolving to (job, succeeded, seconds) once its batch is done.
+        """
+        futures = {id(job): Future() for job in jobs}
+        for batch in self.batches(jobs):
+            self.batches_run += 1
+            self.executor.submit(self.run_batch, f"batch_{self.batches_run}", batch,
+                                 [futures[id(job)] for job in batch])
+        return [futures[id(job)] for job in jobs]
+
+    def run_batch(self, batch_id, jobs, futures):
+        worker = self.idle.get()
+        started = time.monotonic()
+        try:
+            timeout = self.timeout * len(jobs) if self.timeout else None
+            ok = worker.run_batch(batch_id, jobs, timeout)
+            results_file = os.path.join(self.data_dir, f"{batch_id}.csv")
+            counts = split_results(results_file, jobs)
+            if os.path.exists(results_file):
+                os.remove(results_file)
+            seconds = time.monotonic() - started
+            for job, future, count in zip(jobs, futures, counts):
+                print(f"  > '{job['keyword']}': {count} results")
+                future.set_result((job, ok, seconds))
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        """Waits for queued batches and stops every worker."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for worker in self.workers:
+            worker.stop()
+
+def build_scraper_pool(conf, data_dir):
+    """Creates the scraper worker pool configured in config/query.json, or None if disabled."""
+    size = conf.get("scraper_pool_size", 0)
+    if not size:
+        return None
+    size = scrape_workers(size, conf.get("scrape_memory_per_job_mb", 1024))
+    return ScraperPool(
+        data_dir,
+        size=size,
+        batch_size=conf.get("scraper_batch_size", DEFAULT_POOL_BATCH_SIZE),
+        commands=conf.get("scraper_commands"),
+        timeout=conf.get("scrape_timeout")
+    )
+
+class LiveScrape:
+    """
+    Runs scrape jobs in the background and yields their rows while the scraper
+    is still writing them, so filtering and domain checks overlap the browser
+    scraping instead of waiting for it. Each job's result CSV is tailed with
+    RawCsvTail. on_result(job, succeeded, seconds) is called as each job ends;
+    results holds every (job, succeeded, seconds) once the chunks are consumed.
+    With a ScraperPool, rows arrive one finished batch at a time.
+    """
+    def __init__(self, jobs, concurrency=1, timeout=None, memory_per_job_mb=1024,
+                 poll_seconds=DEFAULT_POLL_SECONDS, on_result=None, pool=None):
+        self.jobs = jobs
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.memory_per_job_mb = memory_per_job_mb
+        self.poll_seconds = poll_seconds
+        self.on_result = on_result
+        self.pool = pool
+        self.results = []
+
+    def chunks(self, chunksize=DEFAULT_CHUNK_SIZE):
+        """Yields raw DataFrames (tagged with their keyword) as the scrapes produce them."""
+        for job in self.jobs:
+            # A partial file left by an interrupted run would be read as new output
+            if os.path.exists(job["output_raw"]):
+                os.remove(job["output_raw"])
+
+        executor = None
+        if self.pool is not None:
+            futures = self.pool.submit(self.jobs)
+        else:
+            executor = ThreadPoolExecutor(max_workers=scrape_workers(self.concurrency, self.memory_per_job_mb))
+            futures = [executor.submit(timed_scrape, job, self.timeout) for job in self.jobs]
+        results = {}
+        try:
+            with METRICS.stage("scrape", len(self.jobs)) as info:
+                running = {
+                    future: RawCsvTail(job["output_raw"], job["keyword"], chunksize)
+                    for future, job in zip(futures, self.jobs)
+                }
+                order = {future: i for i, future in enumerate(running)}
+                while running:
+                    backlog = False
+                    for future, tail in list(running.items()):
+                        # Checked before reading, so the last read sees everything the scraper wrote
+                        finished = future.done()
+                        yield from tail.read(final=finished)
+                        backlog = backlog or not tail.at_eof
+                        if finished and tail.at_eof:
+                            del running[future]
+                            results[order[future]] = future.result()
+                            if self.on_result is not None:
+                                self.on_result(*results[order[future]])
+                    if running and not backlog:
+                        time.sleep(self.poll_seconds)
+                self.results = [results[i] for i in sorted(results)]
+                info["rows_out"] = sum(1 for _, ok, _ in self.results if ok)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        print_scrape_summary(self.results)
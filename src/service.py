@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from template_matcher import get_best_template
+from domain_checker import build_domain_checker
+from names import clean_name_for_domain
+from job_queue import JobQueue, expand_manifest, DEFAULT_QUEUE_PATH
+from upload_to_sheets import upload_to_sheets, authorize_client, sheet_options
+
+# Local only: the service is meant for integrations running on the same machine
+SERVICE_HOST = "127.0.0.1"
+DEFAULT_SERVICE_PORT = 8765
+CREDENTIALS_PATH = "config/service_account.json"
+UPLOAD_DIR = "processed_data"
+
+# (method, path) -> LeadFinderService method
+ROUTES = {
+    ("GET", "/health"): "health",
+    ("GET", "/classify"): "classify",
+    ("POST", "/classify"): "classify",
+    ("GET", "/check-domain"): "check_domain",
+    ("POST", "/check-domain"): "check_domain",
+    ("GET", "/jobs"): "job_status",
+    ("POST", "/jobs"): "submit_jobs",
+    ("POST", "/upload"): "upload"
+}
+
+class ServiceError(Exception):
+    """A request error reported to the client with an HTTP status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_domain(value, field):
+    """Normalizes a domain from a request; anything but a non-empty string with a TLD is a 400."""
+    if not isinstance(value, str) or not value.strip():
+        raise ServiceError(400, f"{field} must be a non-empty string")
+    domain = value.strip().lower()
+    if "." not in domain:
+        raise ServiceError(400, f"{field} must include a TLD")
+    return domain
+
+class LeadFinderService:
+    """
+    Request handlers sharing warm state between calls: the domain checker
+    (with its cache and rate limits), the compiled template index and,
+    once authorized, the Google Sheets client.
+    """
+    def __init__(self, conf, sheets_client=None):
+        self.conf = conf
+        self.domain_checker = build_domain_checker(conf)
+        self.queue_path = conf.get("job_queue_path", DEFAULT_QUEUE_PATH)
+        self.sheets_client = sheets_client
+        self.sheets_lock = threading.Lock()
+        self.started = time.time()
+
+    def health(self, params):
+        health = {"status": "ok", "uptime_seconds": round(time.time() - self.started, 1)}
+        if self.domain_checker.cache is not None:
+            health["domain_cache"] = self.domain_checker.cache.stats()
+        return health
+
+    def classify(self, params):
+        """Best template and Magic Link for one business."""
+        name = params.get("name")
+        if not name:
+            raise ServiceError(400, "'name' is required")
+        slug, link = get_best_template(
+            name,
+            params.get("city", ""),
+            params.get("phone", ""),
+            params.get("address", ""),
+            search_keyword=params.get("keyword"),
+            forced_template=params.get("template") or self.conf.get("template")
+        )
+        return {"template": slug, "magic_link": link}
+
+    def check_domain(self, params):
+        """Availability of one domain, a list of domains, or a business name on every TLD."""
+        if "domains" in params:
+            if not isinstance(params["domains"], list):
+                raise ServiceError(400, "'domains' must be a list")
+            domains = [parse_domain(d, "every entry in 'domains'") for d in params["domains"]]
+            return {"domains": self.domain_checker.check_domains(domains)}
+        if "domain" in params:
+            domain = parse_domain(params["domain"], "'domain'")
+            return {"domain": domain, "status": self.domain_checker.check(domain)}
+        if not params.get("name"):
+            raise ServiceError(400, "'domain', 'domains' or 'name' is required")
+        if not isinstance(params["name"], str):
+            raise ServiceError(400, "'name' must be a string")
+        base_name = clean_name_for_domain(params["name"])
+        result = {"base_name": base_name}
+        for tld in self.domain_checker.tlds:
+            result[tld] = self.domain_checker.check(f"{base_name}.{tld}" if base_name else "")
+        return result
+
+    def submit_jobs(self, params):
+        """
+        Enqueues scrape jobs: either a batch manifest (with "cities")
+        or a single job {"keyword", "city", "lat", "lon", ...}.
+        """
+        if "cities" in params:
+            jobs = expand_manifest(params)
+        elif params.get("keyword"):
+            job_params = {k: v for k, v in params.items() if k not in ("campaign", "city")}
+            jobs = [{"campaign": params.get("campaign", "service"), "city": params.get("city", ""),
+                     "keyword": params["keyword"], "params": job_params}]
+        else:
+            raise ServiceError(400, "'keyword' or a manifest with 'cities' is required")
+        # SQLite connections are per thread, so each request opens its own
+        queue = JobQueue(self.queue_path)
+        try:
+            return {"enqueued": queue.enqueue(jobs), "queue": self.queue_path}
+        finally:
+            queue.close()
+
+    def job_status(self, params):
+        queue = JobQueue(self.queue_path)
+        try:
+            status = {"counts": queue.status_counts()}
+            if params.get("status"):
+                status["jobs"] = queue.jobs(params["status"])
+            return status
+        finally:
+            queue.close()
+
+    def get_sheets_client(self):
+        """Authorizes the service account once and reuses the client."""
+        with self.sheets_lock:
+            if self.sheets_client is None:
+                self.sheets_client = authorize_client(CREDENTIALS_PATH)
+            return self.sheets_client
+
+    def upload(self, params):
+        """Uploads a leads file from processed_data/ (e.g. a finished job's CSV)."""
+        spreadsheet_id = self.conf.get("spreadsheet_id")
+        if not spreadsheet_id:
+            raise ServiceError(400, "'spreadsheet_id' not found in config/query.json")
+        path = os.path.abspath(params.get("file") or os.path.join(UPLOAD_DIR, "filtered_leads.csv"))
+        if os.path.commonpath([path, os.path.abspath(UPLOAD_DIR)]) != os.path.abspath(UPLOAD_DIR):
+            raise ServiceError(400, f"Only files under {UPLOAD_DIR}/ can be uploaded")
+        if not os.path.exists(path):
+            raise ServiceError(404, f"{path} not found")
+        ok = upload_to_sheets(path, CREDENTIALS_PATH, spreadsheet_id, client=self.get_sheets_client(),
+                              **sheet_options(self.conf))
+        return {"ok": ok, "file": path}
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so clients can reuse one connection for many calls
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.dispatch("GET")
+
+        def do_POST(self):
+            self.dispatch("POST")
+
+        def dispatch(self, method):
+            url = urlparse(self.path)
+            try:
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if method == "POST":
+                    params.update(self.read_json())
+                route = ROUTES.get((method, url.path.rstrip("/") or "/"))
+                if route is None:
+                    raise ServiceError(404, f"No endpoint {method} {url.path}")
+                self.respond(200, getattr(service, route)(params))
+            except ServiceError as e:
+                self.respond(e.status, {"error": str(e)})
+            except Exception as e:
+                print(f"Service error on {method} {url.path}: {e}")
+                self.respond(500, {"error": str(e)})
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                raise ServiceError(400, "Request body must be JSON")
+            if not isinstance(body, dict):
+                raise ServiceError(400, "Request body must be a JSON object")
+            return body
+
+        def respond(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Per-lead calls would flood the console
+            pass
+
+    return Handler
+
+def run_service(conf, port=None):
+    """Serves the LeadFinder API on localhost until interrupted."""
+    port = port or conf.get("service_port", DEFAULT_SERVICE_PORT)
+    service = LeadFinderService(conf)
+    server = ThreadingHTTPServer((SERVICE_HOST, port), make_handler(service))
+    server.daemon_threads = True
+    print(f"--- LeadFinder service listening on http://{SERVICE_HOST}:{port} ---")
+    print("  GET /health | GET,POST /classify | GET,POST /check-domain | GET,POST /jobs | POST /upload")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("--- Service stopped ---")
+    finally:
+        server.server_close()
+        if service.domain_checker.cache is not None:
+            service.domain_checker.cache.close()
@@ -0,0 +1,215 @@
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import gspread
+from gspread.utils import rowcol_to_a1
+from metrics import METRICS
+
+# HTTP statuses worth retrying: quota (429) and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Appends are not idempotent: a 5xx may come after the rows were written, so only
+# quota rejections (never applied) are retried
+APPEND_RETRYABLE_STATUS = {429}
+
+def status_code(error):
+    """Extracts the HTTP status from a gspread APIError (or a look-alike)."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+def chunk_rows(rows, max_rows=500, max_bytes=1_000_000):
+    """
+    Splits rows into chunks bounded by row count and approximate JSON payload size.
+    """
+    chunk = []
+    size = 0
+    for row in rows:
+        row_size = len(json.dumps(row, default=str))
+        if chunk and (len(chunk) >= max_rows or size + row_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+def shard_title(value):
+    """Turns a column value into a valid worksheet title."""
+    title = re.sub(r"[\[\]:*?/\\]", " ", str(value)).strip()[:100]
+    return title or "Unknown"
+
+class SheetsWriter:
+    """
+    Writes DataFrames to a gspread Spreadsheet in size-bounded chunks.
+    Rate-limited calls are retried with exponential backoff, and chunks that
+    still fail are returned to the caller instead of being dropped.
+    Works with any client exposing the gspread Spreadsheet/Worksheet methods used here.
+    """
+    def __init__(self, spreadsheet, chunk_size=500, max_chunk_bytes=1_000_000,
+                 max_retries=5, backoff=1.0, workers=4):
+        self.spreadsheet = spreadsheet
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.workers = max(1, int(workers))
+        self.api_calls = 0
+        self.lock = threading.Lock()
+        self.worksheet_lock = threading.Lock()
+
+    def call(self, fn, *args, retry_on=RETRYABLE_STATUS, **kwargs):
+        """Calls a Sheets API method, retrying on the HTTP statuses in retry_on."""
+        for attempt in range(self.max_retries + 1):
+            with self.lock:
+                self.api_calls += 1
+            METRICS.count("sheets_api_calls")
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if status_code(e) not in retry_on or attempt == self.max_retries:
+                    raise
+                METRICS.count("sheets_api_retries")
+                delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+                print(f"  > Sheets API returned {status_code(e)}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def get_worksheet(self, title):
+        """Opens a worksheet by title, creating it if needed."""
+        with self.worksheet_lock:
+            try:
+                return self.call(self.spreadsheet.worksheet, title)
+            except gspread.exceptions.WorksheetNotFound:
+                return self.call(self.spreadsheet.add_worksheet, title=title, rows=1000, cols=26)
+
+    def initialize(self, worksheet, header):
+        """Writes the header row and applies table formatting."""
+        self.call(worksheet.update, range_name='A1', values=[header])
+
+        # Table Formatting: Freeze top row and make bold
+        self.call(worksheet.freeze, rows=1)
+        self.call(worksheet.format, f"A1:{rowcol_to_a1(1, len(header))}", {
+            "textFormat": {"bold": True},
+            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
+        })
+        # Basic auto-filter on the header row
+        self.call(worksheet.set_basic_filter)
+
+    def extend_header(self, worksheet, header, columns):
+        """
+        Adds the columns the sheet's header row lacks (e.g. ones added to the output
+        after the sheet was created) to its end, so their values are not dropped.
+        Returns the new header.
+        """
+        missing = [c for c in columns if c not in header]
+        if not missing:
+            return header
+        print(f"  > Adding columns {', '.join(missing)} to the header of '{worksheet.title}'")
+        first_col = len(header) + 1
+        header = header + missing
+        if worksheet.col_count < len(header):
+            self.call(worksheet.add_cols, len(header) - worksheet.col_count)
+        self.call(worksheet.update, range_name=rowcol_to_a1(1, first_col), values=[missing])
+        return header
+
+    def append(self, worksheet, rows):
+        """
+        Appends rows chunk by chunk.
+        Returns: (rows written, rows that failed)
+        """
+        written, failed = 0, []
+        for chunk in chunk_rows(rows, self.chunk_size, self.max_chunk_bytes):
+            try:
+                self.call(worksheet.append_rows, chunk, retry_on=APPEND_RETRYABLE_STATUS)
+                written += len(chunk)
+            except Exception as e:
+                print(f"Error appending {len(chunk)} rows to '{worksheet.title}': {e}")
+                failed.extend(chunk)
+        return written, failed
+
+    def upsert(self, worksheet, df, header, key_column):
+        """
+        Incremental sync keyed by key_column.
+        Only the key column is read from the sheet. Rows whose key already
+        exists are overwritten with batch_update; new keys are appended.
+        Returns: (rows updated, rows appended, rows that failed, columns of the failed rows)
+        """
+        if key_column not in header or key_column not in df.columns:
+            print(f"Warning: key column '{key_column}' missing, appending all rows.")
+            appended, failed = self.append(worksheet, df.values.tolist())
+            return 0, appended, failed, df.columns.tolist()
+
+        # Align the CSV to the sheet's column order
+        df = df.reindex(columns=header, fill_value='')
+
+        key_idx = header.index(key_column) + 1
+        existing_keys = self.call(worksheet.col_values, key_idx)[1:]
+        # Sheet row number for every key (row 1 is the header)
+        key_rows = {key: i + 2 for i, key in enumerate(existing_keys) if key}
+
+        updates = []
+        new_rows = []
+        last_col = rowcol_to_a1(1, len(header)).rstrip("0123456789")
+        for values in df.values.tolist():
+            key = str(values[key_idx - 1])
+            row = key_rows.get(key) if key else None
+            if row:
+                updates.append({"range": f"A{row}:{last_col}{row}", "values": [values]})
+            else:
+                new_rows.append(values)
+
+        updated, failed = 0, []
+        for chunk in chunk_rows(updates, self.chunk_size, self.max_chunk_bytes):
+            try:
+                self.call(worksheet.batch_update, chunk)
+                updated += len(chunk)
+            except Exception as e:
+                print(f"Error updating {len(chunk)} rows in '{worksheet.title}': {e}")
+                failed.extend(u["values"][0] for u in chunk)
+
+        appended, append_failed = self.append(worksheet, new_rows)
+        return updated, appended, failed + append_failed, header
+
+    def write(self, worksheet, df, mode="append", key_column="Maps URL"):
+        """
+        Writes a DataFrame to one worksheet.
+        Returns: {"worksheet", "updated", "appended", "failed_rows", "columns"}
+        (failed_rows are lists of values in the order of columns).
+        """
+        header = self.call(worksheet.row_values, 1)
+        updated = 0
+        columns = df.columns.tolist()
+        if not header:
+            # Sheet is empty, write headers + data
+            header = df.columns.values.tolist()
+            self.initialize(worksheet, header)
+            appended, failed = self.append(worksheet, df.values.tolist())
+        else:
+            header = self.extend_header(worksheet, header, df.columns)
+            if mode == "upsert":
+                updated, appended, failed, columns = self.upsert(worksheet, df, header, key_column)
+            else:
+                # Sheet has data, append new rows in the sheet's column order
+                columns = header
+                appended, failed = self.append(worksheet, df.reindex(columns=header, fill_value='').values.tolist())
+        return {"worksheet": worksheet.title, "updated": updated, "appended": appended, "failed_rows": failed,
+                "columns": columns}
+
+    def write_sharded(self, df, shard_column, mode="append", key_column="Maps URL"):
+        """
+        Writes one worksheet per distinct value of shard_column, in parallel.
+        Returns: list of write() results.
+        """
+        titles = df[shard_column].fillna('').map(shard_title)
+        shards = list(df.groupby(titles, sort=True))
+
+        def write_shard(shard):
+            title, group = shard
+            return self.write(self.get_worksheet(title), group, mode, key_column)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(write_shard, shards))
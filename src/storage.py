@@ -0,0 +1,165 @@
+import os
+import pandas as pd
+
+# pyarrow is optional: without it everything stays CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+STORAGE_FORMATS = ["csv", "parquet"]
+
+# Declared column types for Parquet files (raw files: ingest.RAW_TYPES)
+LEAD_TYPES = {
+    'Business Name': 'str',
+    'City': 'str',
+    'Address': 'str',
+    'Contact Profile': 'str',
+    'Domain .PL': 'str',
+    'Domain .COM': 'str',
+    'Template Slug': 'str',
+    'Magic Link': 'str',
+    'Digital Score': 'int64',
+    'Reviews': 'int64',
+    'Rating': 'float64',
+    'Maps URL': 'str',
+    'Postal Code': 'str'
+}
+
+# Identifies a processed lead in output files
+LEAD_KEY_COLUMN = 'Maps URL'
+
+def arrow_schema(types):
+    arrow_types = {'str': pa.string(), 'int64': pa.int64(), 'float64': pa.float64()}
+    return pa.schema([(name, arrow_types[t]) for name, t in types.items()])
+
+def resolve_format(storage_format):
+    """
+    Returns the storage format to use, falling back to CSV
+    when Parquet is requested but pyarrow is not installed.
+    """
+    storage_format = (storage_format or "csv").lower()
+    if storage_format not in STORAGE_FORMATS:
+        print(f"Warning: unknown storage_format '{storage_format}', using csv.")
+        return "csv"
+    if storage_format == "parquet" and pa is None:
+        print("Warning: storage_format 'parquet' needs pyarrow (pip install pyarrow), using csv.")
+        return "csv"
+    return storage_format
+
+def conform(df, types):
+    """
+    Casts a DataFrame to the declared types, adding missing columns as nulls
+    and dropping undeclared ones.
+    """
+    out = pd.DataFrame(index=df.index)
+    for name, t in types.items():
+        col = df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if t == 'int64':
+            out[name] = pd.to_numeric(col, errors='coerce').round().astype('Int64')
+        elif t == 'float64':
+            out[name] = pd.to_numeric(col, errors='coerce').astype('float64')
+        else:
+            out[name] = col.astype(object).where(col.notna(), None)
+    return out
+
+def write_parquet(df, path, types):
+    table = pa.Table.from_pandas(conform(df, types), schema=arrow_schema(types), preserve_index=False)
+    pq.write_table(table, path)
+
+def parquet_path(path):
+    return os.path.splitext(path)[0] + ".parquet"
+
+def iter_parquet_chunks(path, columns, chunksize):
+    """Reads only the requested columns of a Parquet file, chunksize rows at a time."""
+    parquet_file = pq.ParquetFile(path)
+    columns = [c for c in columns if c in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+def write_leads(leads, output_file, storage_format="csv"):
+    """
+    Saves processed leads. The CSV is always written (it is what gets uploaded);
+    with the Parquet format a typed copy is saved next to it.
+    """
+    leads.to_csv(output_file, index=False)
+    if storage_format == "parquet":
+        write_parquet(leads, parquet_path(output_file), LEAD_TYPES)
+
+class LeadFileSink:
+    """
+    Appends processed leads to output_file batch by batch (streaming mode),
+    flushing after every batch so partial results can be read during the run.
+    The file is only replaced once the first batch arrives; with append=True
+    (a resumed run) rows are added to the existing file instead. With the
+    Parquet format a typed copy is written incrementally next to it.
+    """
+    def __init__(self, output_file, storage_format="csv", append=False):
+        self.output_file = output_file
+        self.storage_format = storage_format
+        self.append = append
+        self.file = None
+        self.parquet_writer = None
+        self.parquet_tmp = None
+        self.existing_keys = None
+        self.rows = 0
+        # Rows held back for a later flush (never: each batch is written immediately)
+        self.buffered = 0
+
+    def open_csv(self):
+        if os.path.dirname(self.output_file):
+            os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
+        if self.append and os.path.exists(self.output_file) and os.path.getsize(self.output_file):
+            # An interrupted run may have written rows that are now processed again
+            existing = pd.read_csv(self.output_file, usecols=lambda c: c == LEAD_KEY_COLUMN, dtype=str)
+            if LEAD_KEY_COLUMN in existing.columns:
+                self.existing_keys = set(existing[LEAD_KEY_COLUMN].dropna())
+            return open(self.output_file, "a", newline="", encoding="utf-8"), False
+        return open(self.output_file, "w", newline="", encoding="utf-8"), True
+
+    def open_parquet(self, schema):
+        path = parquet_path(self.output_file)
+        self.parquet_tmp = path + ".tmp"
+        writer = pq.ParquetWriter(self.parquet_tmp, schema)
+        if self.append and os.path.exists(path):
+            # Parquet files can't be appended to: copy the earlier rows first
+            for batch in pq.ParquetFile(path).iter_batches():
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        return writer
+
+    def write(self, leads):
+        header = False
+        if self.file is None:
+            self.file, header = self.open_csv()
+        if self.existing_keys and LEAD_KEY_COLUMN in leads.columns:
+            leads = leads[~leads[LEAD_KEY_COLUMN].isin(self.existing_keys)]
+        leads.to_csv(self.file, index=False, header=header)
+        self.file.flush()
+
+        if self.storage_format == "parquet":
+            schema = arrow_schema(LEAD_TYPES)
+            if self.parquet_writer is None:
+                self.parquet_writer = self.open_parquet(schema)
+            self.parquet_writer.write_table(
+                pa.Table.from_pandas(conform(leads, LEAD_TYPES), schema=schema, preserve_index=False))
+        self.rows += len(leads)
+
+    def poll(self):
+        """Nothing to do: every batch is written as it arrives."""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            os.replace(self.parquet_tmp, parquet_path(self.output_file))
+        return True
+
+def read_leads(path):
+    """Reads processed leads from a CSV or Parquet file."""
+    if path.endswith(".parquet"):
+        # Object columns so nullable integers can be filled like CSV data
+        return pd.read_parquet(path).astype(object)
+    return pd.read_csv(path)
@@ -0,0 +1,204 @@
+import queue
+import threading
+import time
+from ingest import apply_cheap_filters
+from filter_leads import (enrich_leads, prioritize_leads, check_lead_domains, match_templates, finalize_leads,
+                          PendingLeadsSink)
+from dedupe import StreamingDeduper
+from storage import LeadFileSink
+from metrics import METRICS
+
+PIPELINE_MODES = ["batch", "stream"]
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUEUE_SIZE = 4
+# How often an idle sink is given the chance to flush, in seconds
+SINK_POLL_SECONDS = 1.0
+
+# Marks the end of the stream on a stage queue
+END = object()
+
+class StreamingPipeline:
+    """
+    Runs read -> filter/enrich -> domain check -> template match -> sinks as
+    concurrent stages over micro-batches of leads. Stages are connected by
+    bounded queues, so at most a few batches per stage are held in memory
+    however large the run, and each batch reaches the sinks as soon as it is done.
+
+    Leads are prioritized within each batch rather than across the whole run,
+    so domain_limit is spent in arrival order.
+    """
+    def __init__(self, domain_checker, sinks, max_reviews=5, forced_template=None, lead_index=None,
+                 deduper=None, domain_limit=None, domain_budget=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.domain_checker = domain_checker
+        self.sinks = sinks
+        self.max_reviews = max_reviews
+        self.forced_template = forced_template
+        self.lead_index = lead_index
+        self.deduper = StreamingDeduper(deduper) if deduper is not None else None
+        self.domain_remaining = domain_limit
+        self.domain_budget = domain_budget
+        self.queue_size = queue_size
+        self.stop = threading.Event()
+        self.errors = []
+
+    # Stages: each takes one batch and returns the next one, or None to drop it
+
+    def prepare(self, chunk):
+        """Cheap filters, known-lead skipping, deduplication and enrichment."""
+        METRICS.count("raw_rows", len(chunk))
+        leads = apply_cheap_filters(chunk, self.max_reviews)
+        if not leads.empty and self.lead_index is not None:
+            leads, seen = self.lead_index.split_known(leads)
+            METRICS.count("known_leads_skipped", seen)
+        if not leads.empty and self.deduper is not None:
+            leads, removed = self.deduper.dedupe(leads)
+            METRICS.count("duplicates_merged", removed)
+        if leads.empty:
+            return None
+        return prioritize_leads(enrich_leads(leads))
+
+    def check_domains(self, leads):
+        limit = self.domain_remaining
+        leads = check_lead_domains(leads, self.domain_checker, limit=limit, budget=self.domain_budget)
+        if limit is not None:
+            self.domain_remaining = max(0, limit - len(leads))
+        return leads
+
+    def match(self, leads):
+        leads = match_templates(leads, self.forced_template)
+        return leads, finalize_leads(leads)
+
+    # Plumbing
+
+    def fail(self, stage, error):
+        print(f"Error in streaming stage '{stage}': {error}")
+        self.errors.append(error)
+        self.stop.set()
+
+    def read(self, chunks, outbox):
+        try:
+            for chunk in chunks:
+                if self.stop.is_set():
+                    break
+                outbox.put(chunk)
+        except Exception as e:
+            self.fail("read", e)
+        finally:
+            outbox.put(END)
+
+    def run_stage(self, name, fn, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is END:
+                break
+            if self.stop.is_set():
+                # Keep draining so upstream stages never block on a full queue
+                continue
+            start = time.perf_counter()
+            try:
+                result = fn(item)
+            except Exception as e:
+                self.fail(name, e)
+                continue
+            METRICS.observe(f"stream_{name}_seconds", time.perf_counter() - start)
+            if result is not None:
+                outbox.put(result)
+        outbox.put(END)
+
+    def index_written(self, unindexed):
+        """
+        Records leads in the lead index once no sink holds them in a buffer,
+        so an interrupted run never skips leads that did not reach the sheet.
+        """
+        if self.lead_index is None or any(sink.buffered for sink in self.sinks):
+            return
+        for leads in unindexed:
+            self.lead_index.add(leads)
+        unindexed.clear()
+
+    def run(self, chunks):
+        """
+        Streams raw chunks (DataFrames of scraper rows) through every stage,
+        then closes the sinks.
+        Returns: (leads written, True if every sink stored every row)
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(4)]
+        stages = [("prepare", self.prepare), ("domains", self.check_domains), ("templates", self.match)]
+        threads = [threading.Thread(target=self.read, args=(chunks, queues[0]), daemon=True)]
+        for (name, fn), inbox, outbox in zip(stages, queues, queues[1:]):
+            threads.append(threading.Thread(target=self.run_stage, args=(name, fn, inbox, outbox), daemon=True))
+        for t in threads:
+            t.start()
+
+        written = 0
+        unindexed = []
+        started = time.perf_counter()
+        try:
+            with METRICS.stage("stream") as info:
+                while True:
+                    try:
+                        item = queues[-1].get(timeout=SINK_POLL_SECONDS)
+                    except queue.Empty:
+                        for sink in self.sinks:
+                            sink.poll()
+                        self.index_written(unindexed)
+                        continue
+                    if item is END:
+                        break
+                    if self.stop.is_set():
+                        continue
+                    leads, final = item
+                    try:
+                        for sink in self.sinks:
+                            sink.write(final)
+                        unindexed.append(leads)
+                        self.index_written(unindexed)
+                    except Exception as e:
+                        self.fail("sink", e)
+                        continue
+                    if not written:
+                        info["first_output_seconds"] = round(time.perf_counter() - started, 3)
+                        print(f"  > First leads written after {info['first_output_seconds']:.1f}s")
+                    written += len(final)
+                    print(f"  > +{len(final)} leads ({written} total)")
+                info["rows_out"] = written
+        finally:
+            ok = all([sink.close() for sink in self.sinks])
+            self.index_written(unindexed)
+
+        for t in threads:
+            t.join()
+        if self.errors:
+            raise self.errors[0]
+        return written, ok
+
+def resolve_pipeline_mode(mode):
+    mode = (mode or "batch").lower()
+    if mode not in PIPELINE_MODES:
+        print(f"Warning: unknown pipeline_mode '{mode}', using batch.")
+        return "batch"
+    return mode
+
+def stream_leads(chunks, output_file, domain_checker, sheets_sink=None, storage_format="csv", append=False,
+                 pending_file=None, **options):
+    """
+    Streaming counterpart of filter_leads: leads are appended to output_file
+    (and, with a SheetsSink, uploaded) in micro-batches as they are processed.
+    chunks: iterable of raw DataFrames (e.g. ingest.iter_raw_files or LiveScrape.chunks).
+    append: keep the rows already in output_file (resumed runs).
+    pending_file: where leads left 'Pending' are saved for --check-pending.
+    options: StreamingPipeline keyword arguments.
+    Returns: (leads written, True if every row reached the sheet)
+    """
+    sinks = [LeadFileSink(output_file, storage_format, append)]
+    if pending_file:
+        sinks.append(PendingLeadsSink(pending_file))
+    if sheets_sink is not None:
+        sinks.append(sheets_sink)
+    written, ok = StreamingPipeline(domain_checker, sinks, **options).run(chunks)
+
+    if domain_checker.cache is not None:
+        domain_checker.cache.print_stats()
+    print(f"Streaming run complete. {written} leads found.")
+    print(f"Output saved to: {output_file}")
+    return written, ok
@@ -119,6 +119,8 @@ TEMPLATE_REGISTRY = {
     ]
 }
 
+DEFAULT_TEMPLATE = "agencja-kreatywna" # Fallback when nothing matches
+
 def clean_text(text):
     """Normalize text for comparison."""
     if not text:
@@ -128,50 +130,139 @@ def clean_text(text):
     text = re.sub(r'[^a-z0-9\s]', '', text)
     return text
 
-def get_best_template(business_name, city, phone, address, search_keyword=None, forced_template=None):
+class TemplateIndex:
     """
-    Analyzes search keyword and business name to find the best template match.
-    Prioritizes forced_template if provided.
-    Returns: (template_slug, magic_link)
+    Compiled form of a template registry.
+    All keywords live in a single Aho-Corasick automaton, so one pass over
+    the text finds every keyword occurrence regardless of registry size.
     """
-    # 0. Forced Template Strategy
-    if forced_template and forced_template.strip():
-        best_slug = forced_template.strip()
-    else:
-        # Intelligent Selection Logic
-        normalized_name = clean_text(business_name)
-        normalized_kw = clean_text(search_keyword) if search_keyword else ""
-        
-        best_slug = "agencja-kreatywna" # Default fallback
-        max_matches = 0
+    def __init__(self, registry):
+        self.slugs = list(registry.keys())
+        self.keywords = []
+        keyword_ids = {}
+        # keyword id -> [(slug order, weight)]; duplicates in a slug's list add weight
+        self.keyword_slugs = []
+        for order, (slug, keywords) in enumerate(registry.items()):
+            weights = {}
+            for kw in keywords:
+                if kw not in keyword_ids:
+                    keyword_ids[kw] = len(self.keywords)
+                    self.keywords.append(kw)
+                    self.keyword_slugs.append([])
+                kw_id = keyword_ids[kw]
+                weights[kw_id] = weights.get(kw_id, 0) + 1
+            for kw_id, weight in weights.items():
+                self.keyword_slugs[kw_id].append((order, weight))
+        self._build_automaton()
+
+    def _build_automaton(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for kw_id, kw in enumerate(self.keywords):
+            state = 0
+            for ch in kw:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.output[state].append(kw_id)
+
+        # Breadth-first pass to set failure links and merge outputs
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def scan(self, text):
+        """
+        Finds all keywords occurring in text.
+        Returns: {keyword_id: True if any occurrence is bounded by spaces or the text edges}
+        """
+        found = {}
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for kw_id in output[state]:
+                if found.get(kw_id):
+                    continue
+                start = end - len(self.keywords[kw_id])
+                found[kw_id] = ((start == 0 or text[start - 1] == " ") and
+                                (end == len(text) or text[end] == " "))
+        return found
+
+    def slug_scores(self, text):
+        """
+        Scores every slug against text: 1 point per matching keyword,
+        plus 2 when it appears as a whole word.
+        Returns: {slug_order: score} for slugs with at least one match.
+        """
+        scores = {}
+        for kw_id, bounded in self.scan(text).items():
+            points = 3 if bounded else 1
+            for order, weight in self.keyword_slugs[kw_id]:
+                scores[order] = scores.get(order, 0) + points * weight
+        return scores
 
+    def classify(self, business_name, search_keyword=None):
+        """Returns the best template slug for a business."""
         # 1. Primary Strategy: Match against Search Keyword
+        normalized_kw = clean_text(search_keyword) if search_keyword else ""
         if normalized_kw:
-            for slug, keywords in TEMPLATE_REGISTRY.items():
-                for kw in keywords:
-                    if kw in normalized_kw:
-                        best_slug = slug
-                        max_matches = 100 # High confidence
-                        break
-                if max_matches == 100:
-                    break
+            found = self.scan(normalized_kw)
+            if found:
+                order = min(o for kw_id in found for o, _ in self.keyword_slugs[kw_id])
+                return self.slugs[order]
 
         # 2. Secondary Strategy: Match against Business Name
-        if max_matches < 100:
-            for slug, keywords in TEMPLATE_REGISTRY.items():
-                matches = 0
-                for keyword in keywords:
-                    if keyword in normalized_name:
-                        matches += 1
-                        if f" {keyword} " in f" {normalized_name} ":
-                            matches += 2
-                
-                if matches > max_matches:
-                    max_matches = matches
-                    best_slug = slug
-
-    # Construct Magic Link (DSA V2 Format)
-    # https://katalog.czerwinskidawid.pl/templates/[slug]?name=...&city=...&address=...&phone=...
+        scores = self.slug_scores(clean_text(business_name))
+        if not scores:
+            return DEFAULT_TEMPLATE
+        # Highest score wins; ties go to the slug registered first
+        order = min(scores, key=lambda o: (-scores[o], o))
+        return self.slugs[order]
+
+TEMPLATE_INDEX = TemplateIndex(TEMPLATE_REGISTRY)
+
+def classify_many(business_names, search_keywords=None, forced_template=None):
+    """
+    Classifies whole columns of business names (and optional search keywords).
+    Each distinct (name, keyword) pair is only scanned once.
+    Returns: list of template slugs.
+    """
+    business_names = list(business_names)
+    if forced_template and forced_template.strip():
+        return [forced_template.strip()] * len(business_names)
+    if search_keywords is None:
+        search_keywords = [None] * len(business_names)
+
+    memo = {}
+    slugs = []
+    for name, kw in zip(business_names, search_keywords):
+        key = (name, kw)
+        slug = memo.get(key)
+        if slug is None:
+            slug = memo[key] = TEMPLATE_INDEX.classify(name, kw)
+        slugs.append(slug)
+    return slugs
+
+def build_magic_link(slug, business_name, city, phone, address):
+    """
+    Construct Magic Link (DSA V2 Format)
+    https://katalog.czerwinskidawid.pl/templates/[slug]?name=...&city=...&address=...&phone=...
+    """
     params = {
         "name": business_name,
         "city": city if city else "",
@@ -183,6 +274,18 @@ def get_best_template(business_name, city, phone, address, search_keyword=None,
     params = {k: v for k, v in params.items() if v is not None}
     
     query_string = urllib.parse.urlencode(params)
-    magic_link = f"{BASE_URL}/templates/{best_slug}?{query_string}"
+    return f"{BASE_URL}/templates/{slug}?{query_string}"
+
+def get_best_template(business_name, city, phone, address, search_keyword=None, forced_template=None):
+    """
+    Analyzes search keyword and business name to find the best template match.
+    Prioritizes forced_template if provided.
+    Returns: (template_slug, magic_link)
+    """
+    # 0. Forced Template Strategy
+    if forced_template and forced_template.strip():
+        best_slug = forced_template.strip()
+    else:
+        best_slug = TEMPLATE_INDEX.classify(business_name, search_keyword)
 
-    return best_slug, magic_link
+    return best_slug, build_magic_link(best_slug, business_name, city, phone, address)
@@ -2,63 +2,193 @@ import gspread
 import pandas as pd
 import sys
 import os
+import time
 from google.oauth2.service_account import Credentials
+# Add src to path so we can import sheets_writer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sheets_writer import SheetsWriter
+from storage import read_leads
 
-def upload_to_sheets(csv_file, credentials_file, spreadsheet_id):
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+def authorize_client(credentials_file):
+    """Returns a gspread client authorized with the service account file."""
+    creds = Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
+    return gspread.authorize(creds)
+
+def sheet_options(conf):
+    """upload_to_sheets keyword arguments from config/query.json settings."""
+    return {
+        "mode": conf.get("sheet_sync_mode", "append"),
+        "key_column": conf.get("sheet_key_column", "Maps URL"),
+        "shard_by": conf.get("sheet_shard_by") or None,
+        "chunk_size": conf.get("sheet_chunk_size", 500),
+        "workers": conf.get("sheet_workers", 4)
+    }
+
+def failed_frame(result):
+    """The failed rows of a SheetsWriter.write() result, labelled with the columns they were written in."""
+    return pd.DataFrame(result['failed_rows'], columns=result['columns'])
+
+def save_failed_rows(failed_frames, failed_file):
+    """Saves rows that could not be uploaded, so a later run can retry them."""
+    # Worksheets with different headers are aligned by column name
+    failed_df = pd.concat(failed_frames, ignore_index=True)
+    failed_df.to_csv(failed_file, index=False)
+    print(f"Error: {len(failed_df)} rows were not uploaded. Saved to {failed_file}")
+
+def upload_to_sheets(csv_file, credentials_file, spreadsheet_id, mode="append", key_column="Maps URL",
+                     shard_by=None, chunk_size=500, workers=4, client=None, failed_file=None):
     """
-    Uploads a CSV file to a Google Spreadsheet.
+    Uploads a CSV (or Parquet) leads file to a Google Spreadsheet.
+    mode: 'append' adds every row; 'upsert' updates rows matched by key_column and appends the rest.
+    shard_by: optional column (e.g. 'City'); each value is written to its own worksheet.
+    client: optional pre-authorized gspread client (or a fake one for testing).
+    Rows that could not be uploaded are saved to failed_file (default: next to the CSV as *_failed.csv).
+    Returns True if every row was uploaded.
     """
     if not os.path.exists(csv_file):
         print(f"Error: CSV file {csv_file} not found.")
-        return
-
-    # Define scope
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
+        return False
 
     try:
-        # Authenticate
-        creds = Credentials.from_service_account_file(credentials_file, scopes=scopes)
-        client = gspread.authorize(creds)
+        if client is None:
+            client = authorize_client(credentials_file)
 
         # Open Spreadsheet
         sh = client.open_by_key(spreadsheet_id)
-        worksheet = sh.get_worksheet(0) # Open the first sheet
+    except Exception as e:
+        print(f"Error connecting to Sheets: {e}")
+        return False
 
-        # Read CSV data
-        df = pd.read_csv(csv_file)
-        
-        # Convert NaN to empty string (JSON doesn't support NaN)
-        df = df.fillna('')
-
-        # Check if sheet is empty to decide on headers
-        current_data = worksheet.get_all_values()
-        
-        if not current_data:
-            # Sheet is empty, write headers + data
-            data_to_upload = [df.columns.values.tolist()] + df.values.tolist()
-            worksheet.update(range_name='A1', values=data_to_upload)
-            
-            # Table Formatting: Freeze top row and make bold
-            worksheet.freeze(rows=1)
-            worksheet.format("A1:L1", {
-                "textFormat": {"bold": True},
-                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
-            })
-            # Enable filter for the header row (using request batch if needed, but simple is better)
-            # Basic auto-filter on the first sheet
-            worksheet.set_basic_filter()
-            
-            print(f"Initialized sheet with {len(df)} rows and table formatting.")
-        else:
-            # Sheet has data, append new rows
-            worksheet.append_rows(df.values.tolist())
-            print(f"Appended {len(df)} rows to existing sheet.")
+    # Read leads
+    df = read_leads(csv_file)
+    
+    # Convert NaN to empty string (JSON doesn't support NaN)
+    df = df.fillna('')
 
+    writer = SheetsWriter(sh, chunk_size=chunk_size, workers=workers)
+    try:
+        if shard_by and shard_by in df.columns:
+            results = writer.write_sharded(df, shard_by, mode, key_column)
+        else:
+            if shard_by:
+                print(f"Warning: shard column '{shard_by}' not in CSV, writing to the first sheet.")
+            worksheet = writer.call(sh.get_worksheet, 0) # Open the first sheet
+            results = [writer.write(worksheet, df, mode, key_column)]
     except Exception as e:
         print(f"Error uploading to Sheets: {e}")
+        return False
+
+    failed = []
+    for r in results:
+        print(f"  > '{r['worksheet']}': {r['appended']} appended, {r['updated']} updated, "
+              f"{len(r['failed_rows'])} failed")
+        if r['failed_rows']:
+            failed.append(failed_frame(r))
+    print(f"Upload finished with {writer.api_calls} Sheets API calls.")
+
+    if failed_file is None:
+        failed_file = os.path.splitext(csv_file)[0] + "_failed.csv"
+    if failed:
+        save_failed_rows(failed, failed_file)
+        return False
+    if os.path.abspath(failed_file) == os.path.abspath(csv_file):
+        # This was a retry of leftover rows, all of which are now in the sheet
+        os.remove(failed_file)
+    return True
+
+class SheetsSink:
+    """
+    Streams leads to a Google Spreadsheet in micro-batches (streaming mode).
+    Rows are buffered and flushed once flush_rows are waiting or flush_seconds
+    have passed since the last flush. Rows that could not be uploaded are
+    saved to failed_file when the sink is closed.
+    """
+    def __init__(self, spreadsheet, failed_file, mode="append", key_column="Maps URL", shard_by=None,
+                 chunk_size=500, workers=4, flush_rows=500, flush_seconds=15):
+        self.spreadsheet = spreadsheet
+        self.writer = SheetsWriter(spreadsheet, chunk_size=chunk_size, workers=workers)
+        self.failed_file = failed_file
+        self.mode = mode
+        self.key_column = key_column
+        self.shard_by = shard_by
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.worksheet = None
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        self.uploaded = 0
+        self.failed = []
+
+    def due(self):
+        return self.buffered > 0 and (self.buffered >= self.flush_rows or
+                                      time.monotonic() - self.last_flush >= self.flush_seconds)
+
+    def write(self, leads):
+        self.buffer.append(leads)
+        self.buffered += len(leads)
+        if self.due():
+            self.flush()
+
+    def poll(self):
+        """Flushes rows that have waited flush_seconds while no new batch arrived."""
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        # Convert NaN to empty string (JSON doesn't support NaN)
+        df = pd.concat(self.buffer, ignore_index=True).astype(object).fillna('')
+        self.buffer, self.buffered = [], 0
+        try:
+            if self.shard_by and self.shard_by in df.columns:
+                results = self.writer.write_sharded(df, self.shard_by, self.mode, self.key_column)
+            else:
+                if self.shard_by:
+                    print(f"Warning: shard column '{self.shard_by}' not in leads, writing to the first sheet.")
+                    self.shard_by = None
+                if self.worksheet is None:
+                    self.worksheet = self.writer.call(self.spreadsheet.get_worksheet, 0)
+                results = [self.writer.write(self.worksheet, df, self.mode, self.key_column)]
+        except Exception as e:
+            print(f"Error uploading {len(df)} rows to Sheets: {e}")
+            self.failed.append(df)
+            return
+        for r in results:
+            self.uploaded += r['appended'] + r['updated']
+            if r['failed_rows']:
+                self.failed.append(failed_frame(r))
+
+    def close(self):
+        """Flushes the remaining rows. Returns True if every row was uploaded."""
+        self.flush()
+        print(f"Sheets: {self.uploaded} rows uploaded in micro-batches "
+              f"with {self.writer.api_calls} Sheets API calls.")
+        if self.failed:
+            save_failed_rows(self.failed, self.failed_file)
+            return False
+        return True
+
+def open_sheets_sink(credentials_file, spreadsheet_id, failed_file, client=None, **options):
+    """
+    Connects to the spreadsheet and returns a SheetsSink, or None if the connection failed.
+    options: SheetsSink keyword arguments (see sheet_options).
+    """
+    try:
+        if client is None:
+            client = authorize_client(credentials_file)
+        sh = client.open_by_key(spreadsheet_id)
+    except Exception as e:
+        print(f"Error connecting to Sheets: {e}")
+        return None
+    return SheetsSink(sh, failed_file, **options)
 
 if __name__ == "__main__":
     # Configuration
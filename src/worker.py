@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from multiprocessing import Process
+from filter_leads import filter_leads
+from scraper import run_scrape_geo
+from ingest import DEFAULT_CHUNK_SIZE
+from storage import resolve_format
+from domain_checker import build_domain_checker, build_check_budget
+from lead_index import build_lead_index
+from dedupe import build_deduper
+from job_queue import JobQueue, worker_name, DEFAULT_LEASE_SECONDS
+
+JOBS_RAW_DIR = "raw_data/jobs"
+JOBS_OUTPUT_DIR = "processed_data/jobs"
+
+def run_job(job, conf, domain_checker, lead_index):
+    """
+    Runs scrape -> filter for one queued job.
+    Job params override config/query.json settings.
+    Returns: result dict stored in the queue.
+    """
+    params = dict(conf)
+    params.update(job["params"])
+    kw = job["keyword"]
+
+    output_raw = os.path.join(JOBS_RAW_DIR, str(job["id"]), f"raw_0_{kw.replace(' ', '_')}.csv")
+    os.makedirs(os.path.dirname(output_raw), exist_ok=True)
+    ok = run_scrape_geo(
+        keyword=kw,
+        lat=params.get("lat"),
+        lon=params.get("lon"),
+        radius=params.get("radius", 5000),
+        output_raw=output_raw,
+        lang=params.get("language", "pl"),
+        depth=params.get("depth", 1),
+        email=params.get("email_scrape", False),
+        timeout=params.get("scrape_timeout")
+    )
+    if not ok or not os.path.exists(output_raw):
+        raise RuntimeError(f"Scrape failed for '{kw}' in {job['city'] or 'configured area'}")
+
+    chunksize = params.get("ingest_chunk_size", DEFAULT_CHUNK_SIZE)
+    storage_format = resolve_format(params.get("storage_format"))
+    # Each job's raw file is read once, so no Parquet copy of it is kept
+    input_files = {output_raw: kw}
+
+    output_csv = os.path.join(JOBS_OUTPUT_DIR, f"job_{job['id']}.csv")
+    leads = filter_leads(
+        input_files=input_files,
+        output_file=output_csv,
+        max_reviews=params.get("max_reviews", 5),
+        forced_template=params.get("template"),
+        domain_checker=domain_checker,
+        chunksize=chunksize,
+        lead_index=lead_index,
+        storage_format=storage_format,
+        deduper=build_deduper(params),
+        domain_limit=params.get("domain_check_limit"),
+        domain_budget=build_check_budget(params),
+        # Collected by --check-pending; one file per job so workers never write the same file
+        pending_file=os.path.join(JOBS_OUTPUT_DIR, f"job_{job['id']}_pending.csv")
+    )
+    if leads is None:
+        return {"output": None, "leads": 0}
+    if lead_index is not None:
+        # The job's CSV is its destination: these leads are done
+        lead_index.add(leads)
+    return {"output": output_csv, "leads": len(leads)}
+
+class LeaseHeartbeat:
+    """
+    Renews a claimed job's lease in the background while the job runs, so jobs
+    longer than job_lease_seconds are not handed to a second worker.
+    Uses its own queue connection (SQLite connections belong to one thread).
+    """
+    def __init__(self, queue_path, job_id, worker, lease_seconds):
+        self.queue_path = queue_path
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        # Several renewals per lease, so one slow or locked write doesn't lose it
+        self.interval = max(1.0, lease_seconds / 3)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        queue = JobQueue(self.queue_path)
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    if not queue.renew(self.job_id, self.worker, self.lease_seconds):
+                        print(f"Warning: job {self.job_id} was reclaimed by another worker.")
+                        return
+                except Exception as e:
+                    print(f"Warning: could not renew the lease of job {self.job_id}: {e}")
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+def run_worker(queue_path, conf, wait=False, poll_seconds=10):
+    """
+    Claims and runs jobs until the queue is empty
+    (or forever, polling every poll_seconds, when wait is True).
+    """
+    queue = JobQueue(queue_path)
+    name = worker_name()
+    domain_checker = build_domain_checker(conf)
+    lead_index = build_lead_index(conf)
+    lease = conf.get("job_lease_seconds", DEFAULT_LEASE_SECONDS)
+    max_attempts = conf.get("job_max_attempts", 3)
+
+    print(f"--- Worker {name} started on {queue_path} ---")
+    processed = 0
+    while True:
+        job = queue.claim(name, lease)
+        if job is None:
+            if not wait:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        print(f"--- [{name}] Job {job['id']}: '{job['keyword']}' in {job['city'] or 'configured area'} "
+              f"(attempt {job['attempts']}) ---")
+        try:
+            with LeaseHeartbeat(queue_path, job["id"], name, lease):
+                result = run_job(job, conf, domain_checker, lead_index)
+            if queue.complete(job["id"], name, result):
+                print(f"--- [{name}] Job {job['id']} done: {result['leads']} leads ---")
+            else:
+                print(f"--- [{name}] Job {job['id']} finished after its lease passed to another worker ---")
+        except Exception as e:
+            if queue.fail(job["id"], name, e, max_attempts):
+                print(f"--- [{name}] Job {job['id']} failed: {e} ---")
+            else:
+                print(f"--- [{name}] Job {job['id']} failed after its lease passed to another worker: {e} ---")
+        processed += 1
+
+    print(f"--- Worker {name} finished after {processed} jobs ---")
+    return processed
+
+def run_local_workers(queue_path, conf, count, wait=False):
+    """Starts count worker processes on this machine and waits for them."""
+    processes = [Process(target=run_worker, args=(queue_path, conf, wait)) for _ in range(count)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+def print_queue_status(queue_path):
+    queue = JobQueue(queue_path)
+    counts = queue.status_counts()
+    print(f"--- Job queue {queue_path} ---")
+    for status in ["pending", "running", "done", "failed"]:
+        print(f"  {status}: {counts.get(status, 0)}")
+    for job in queue.jobs("failed"):
+        print(f"  [FAILED] #{job['id']} '{job['keyword']}' in {job['city']}: {job['error']}")